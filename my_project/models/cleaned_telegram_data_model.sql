@@ -1,6 +1,7 @@
 -- models/cleaned_telegram_data_model.sql
 
 SELECT
+    channel,
     message_id,
     date,
     sender_id,
@@ -1,10 +1,18 @@
 # scripts/data_cleaning.py
 
 import pandas as pd
+import argparse
+import io
+import itertools
 import json
 import logging
 import psycopg2
+import psycopg2.errors
 import os
+import time
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from near_duplicates import NearDuplicateIndex
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,12 +21,50 @@ def load_raw_data(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
 
-def clean_data(raw_data):
-    df = pd.DataFrame(raw_data)
-    
-    # Remove duplicates
-    df.drop_duplicates(subset='id', inplace=True)
-    
+def iter_raw_records(file_path, read_size=1 << 16):
+    """Yield records one at a time from a JSON array or NDJSON file.
+
+    Only `read_size` characters plus the record being decoded are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = f.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            # NDJSON: one record per line
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        position, eof = 1, False
+        while True:
+            # Skip whitespace and separators between array elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+                # A record ending exactly at the buffer edge may be cut short
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if complete:
+                yield record
+                position = end
+                continue
+            more = f.read(read_size)
+            eof = not more
+            buffer = buffer[position:] + more
+            position = 0
+            if eof and not buffer.strip():
+                raise ValueError(f"Unterminated JSON array in {file_path}")
+
+def _standardize(df):
+    """Fill missing values and standardize formats in a deduplicated frame."""
     # Handle missing values
     df.fillna('', inplace=True)
     
@@ -28,41 +74,205 @@ def clean_data(raw_data):
     
     return df
 
-def save_cleaned_data(df):
+def mark_near_duplicates(df, dedup_index, drop=False):
+    """Add canonical_id (and canonical_channel, if df has channels) from `dedup_index`.
+
+    With `drop`, keep only canonical messages.
+    """
+    canonical = dedup_index.assign(df)
+    df['canonical_id'] = canonical['canonical_id']
+    is_canonical = df['canonical_id'] == df['id']
+    if 'channel' in df.columns:
+        df['canonical_channel'] = canonical['canonical_channel']
+        is_canonical &= df['canonical_channel'] == df['channel']
+    if drop:
+        df = df[is_canonical]
+    return df
+
+def clean_data(raw_data, dedup_index=None, drop_near_duplicates=False):
+    df = pd.DataFrame(raw_data)
+    
+    # Remove duplicates
+    df.drop_duplicates(subset='id', inplace=True)
+    
+    df = _standardize(df)
+    if dedup_index is not None:
+        df = mark_near_duplicates(df, dedup_index, drop_near_duplicates)
+    return df
+
+def clean_chunk(records, seen_ids, dedup_index=None, drop_near_duplicates=False):
+    """Clean one chunk of records, dropping ids already seen in earlier chunks.
+
+    `seen_ids` is updated in place so dedup on 'id' holds across the whole file;
+    `dedup_index` likewise carries near-duplicate detection across chunks.
+    """
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+    df.drop_duplicates(subset='id', inplace=True)
+    df = df[~df['id'].isin(seen_ids)].copy()
+    seen_ids.update(df['id'])
+    df = _standardize(df)
+    if dedup_index is not None:
+        df = mark_near_duplicates(df, dedup_index, drop_near_duplicates)
+    return df
+
+def clean_data_streaming(file_path, sink, chunk_size=10000, dedup_index=None, drop_near_duplicates=False):
+    """Clean a raw dump in chunks of `chunk_size` records, passing each cleaned chunk to `sink`.
+
+    Peak memory is bounded by the chunk size rather than the file size.
+    """
+    records = iter_raw_records(file_path)
+    seen_ids = set()
+    total_read, total_written = 0, 0
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        total_read += len(chunk)
+        df = clean_chunk(chunk, seen_ids, dedup_index, drop_near_duplicates)
+        if not df.empty:
+            sink(df)
+            total_written += len(df)
+        logging.info(f"Cleaned chunk of {len(chunk)} records ({total_written}/{total_read} kept so far).")
+    return total_read, total_written
+
+# Target table and the DataFrame column feeding each of its columns
+SUPPLIERS_TABLE = 'suppliers'
+SUPPLIER_COLUMNS = {'name': 'name', 'contact_info': 'contact_info', 'created_at': 'date'}
+
+def get_connection():
+    # Connect to your PostgreSQL database
+    return psycopg2.connect(
+        dbname='Ethiopian_Medical_Data',
+        user='postgres',
+        password='admin',
+        host='localhost',
+        port='5432'
+    )
+
+def _copy_batches(cur, table, columns, df, batch_size):
+    """Stream the frame through COPY FROM STDIN in CSV batches of `batch_size` rows."""
+    copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(
+        sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+    for start in range(0, len(df), batch_size):
+        buffer = io.StringIO()
+        df.iloc[start:start + batch_size].to_csv(buffer, header=False, index=False, na_rep='\\N')
+        buffer.seek(0)
+        cur.copy_expert(copy_query.as_string(cur), buffer)
+
+def _insert_batches(cur, table, columns, df, batch_size, conflict_clause):
+    """Insert the frame with multi-row VALUES statements of `batch_size` rows."""
+    insert_query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+        sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))
+    ) + conflict_clause
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    execute_values(cur, insert_query.as_string(cur), rows, page_size=batch_size)
+
+def _conflict_clause(columns, upsert_on):
+    if not upsert_on:
+        return sql.SQL('')
+    updates = [column for column in columns if column not in upsert_on]
+    if not updates:
+        return sql.SQL(" ON CONFLICT ({}) DO NOTHING").format(sql.SQL(', ').join(map(sql.Identifier, upsert_on)))
+    return sql.SQL(" ON CONFLICT ({}) DO UPDATE SET {}").format(
+        sql.SQL(', ').join(map(sql.Identifier, upsert_on)),
+        sql.SQL(', ').join(sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in updates),
+    )
+
+def _load(cur, table, columns, df, method, batch_size, upsert_on):
+    conflict_clause = _conflict_clause(columns, upsert_on)
+    if upsert_on:
+        # One row per key, the last one winning: a single INSERT ... ON CONFLICT DO UPDATE
+        # cannot touch the same row twice
+        frame_columns = dict(zip(columns, df.columns))
+        df = df.drop_duplicates(subset=[frame_columns[column] for column in upsert_on], keep='last')
+    if method == 'values':
+        _insert_batches(cur, table, columns, df, batch_size, conflict_clause)
+    elif not upsert_on:
+        _copy_batches(cur, table, columns, df, batch_size)
+    else:
+        # COPY cannot resolve conflicts, so stage the rows and upsert from the staging table
+        staging = f"{table}_staging"
+        cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+            sql.Identifier(staging), sql.Identifier(table)
+        ))
+        _copy_batches(cur, staging, columns, df, batch_size)
+        column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+        cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT DISTINCT ON ({}) {} FROM {}").format(
+            sql.Identifier(table),
+            column_list,
+            sql.SQL(', ').join(map(sql.Identifier, upsert_on)),
+            column_list,
+            sql.Identifier(staging),
+        ) + conflict_clause)
+
+def save_cleaned_data(df, method='copy', batch_size=10000, upsert_on=None, conn=None):
+    """Bulk load the cleaned data into the suppliers table in one transaction.
+
+    `method` is 'copy' (COPY FROM STDIN) or 'values' (batched multi-row INSERT);
+    COPY falls back to VALUES if the server rejects it. With `upsert_on` (a list of
+    key columns backed by a unique constraint) existing rows are updated instead
+    of duplicated. Pass `conn` to reuse an open connection across calls.
+    """
+    columns = list(SUPPLIER_COLUMNS)
+    frame = df[list(SUPPLIER_COLUMNS.values())]
+    own_connection = conn is None
+    start = time.perf_counter()
     try:
-        # Connect to your PostgreSQL database
-        conn = psycopg2.connect(
-            dbname='Ethiopian_Medical_Data',
-            user='postgres',
-            password='admin',
-            host='localhost',
-            port='5432'
-        )
-        cur = conn.cursor()
-
-        # Insert cleaned data into the database
-        for index, row in df.iterrows():
-            cur.execute(
-                """
-                INSERT INTO suppliers (name, contact_info, created_at)
-                VALUES (%s, %s, %s)
-                """,
-                (row['name'], row['contact_info'], row['date'])
-            )
+        if own_connection:
+            conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                _load(cur, SUPPLIERS_TABLE, columns, frame, method, batch_size, upsert_on)
+        except (psycopg2.NotSupportedError, psycopg2.errors.InsufficientPrivilege) as error:
+            if method != 'copy':
+                raise
+            conn.rollback()
+            logging.warning(f"COPY not available ({error}), falling back to batched INSERT.")
+            with conn.cursor() as cur:
+                _load(cur, SUPPLIERS_TABLE, columns, frame, 'values', batch_size, upsert_on)
 
         conn.commit()
-        cur.close()
-        logging.info("Cleaned data saved to the database successfully.")
+        elapsed = time.perf_counter() - start
+        rate = len(frame) / elapsed if elapsed > 0 else float('inf')
+        logging.info(f"Cleaned data saved to the database successfully: {len(frame)} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
     except (Exception, psycopg2.DatabaseError) as error:
+        if conn is not None:
+            conn.rollback()
         logging.error(f"Error while saving cleaned data: {error}")
     finally:
-        if conn is not None:
+        if own_connection and conn is not None:
             conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean raw Telegram data and save it to the database.")
+    parser.add_argument('--stream', action='store_true', help="Read and clean the raw dump in bounded-memory chunks.")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="Records per chunk in streaming mode.")
+    parser.add_argument('--load-method', choices=['copy', 'values'], default='copy', help="Bulk load with COPY or batched INSERT.")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Rows per COPY/INSERT batch.")
+    parser.add_argument('--upsert-on', nargs='+', help="Key columns to upsert on instead of inserting duplicates.")
+    parser.add_argument('--dedup-index', help="Near-duplicate index file; adds canonical_id and canonical_channel columns and is updated after the run.")
+    parser.add_argument('--drop-near-duplicates', action='store_true', help="With --dedup-index, keep only canonical messages.")
+    args = parser.parse_args()
+
     # Specify the raw data path
     raw_data_path = r'C:\Users\hayyu.ragea\AppData\Local\Programs\Python\Python312\Ethiopian_Medical_Data\data\raw\telegram_data\raw_data.json'
-    raw_data = load_raw_data(raw_data_path)
-    cleaned_data = clean_data(raw_data)
-    save_cleaned_data(cleaned_data)
+    load_options = {'method': args.load_method, 'batch_size': args.batch_size, 'upsert_on': args.upsert_on}
+    dedup_index = NearDuplicateIndex.load(args.dedup_index) if args.dedup_index else None
+    dedup_options = {'dedup_index': dedup_index, 'drop_near_duplicates': args.drop_near_duplicates}
+    if args.stream:
+        # Reuse one connection for every chunk; each chunk is still its own transaction
+        conn = get_connection()
+        try:
+            clean_data_streaming(raw_data_path, lambda df: save_cleaned_data(df, conn=conn, **load_options), chunk_size=args.chunk_size, **dedup_options)
+        finally:
+            conn.close()
+    else:
+        raw_data = load_raw_data(raw_data_path)
+        cleaned_data = clean_data(raw_data, **dedup_options)
+        save_cleaned_data(cleaned_data, **load_options)
+    if dedup_index is not None:
+        dedup_index.save(args.dedup_index)
     logging.info("Data cleaning complete. Cleaned data saved.")
@@ -0,0 +1,156 @@
+# scripts/cleaning/near_duplicates.py
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+import time
+import unicodedata
+import zlib
+import numpy as np
+import pandas as pd
+
+# Words are runs of Unicode letters/digits (Latin and Ethiopic); everything else separates them
+WORD_PATTERN = re.compile(r'\w+')
+
+# MinHash permutations h(x) = (a * x + b) mod p over 32-bit shingle hashes
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Bumped when the index's keys change, so load() does not reuse an incompatible index
+INDEX_VERSION = 2
+
+def normalize_words(text):
+    """Lowercase, NFC-normalize and split text into words, dropping punctuation and spacing."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return []
+    return WORD_PATTERN.findall(unicodedata.normalize('NFC', str(text)).lower())
+
+def content_hash(words):
+    """Hash of the normalized text: equal for messages that differ only in case, spacing or punctuation."""
+    return hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=16).hexdigest()
+
+def shingle_hashes(words, size=3):
+    """Stable 32-bit hashes of the word `size`-grams (the whole text if it is shorter)."""
+    if len(words) <= size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+class NearDuplicateIndex:
+    """Assigns each message the key of the first message it (nearly) duplicates.
+
+    Messages are keyed by (channel, id), since message ids are only unique
+    within a channel. Texts with fewer than `min_words` words (including
+    media-only posts with no text) carry too little to compare, so they are
+    their own canonical message and are not indexed.
+
+    Exact duplicates are found by content hash. Near-duplicates are found with
+    MinHash signatures split into `bands` LSH bands: only messages sharing at
+    least one band bucket are compared, so a batch costs roughly linear time
+    rather than one comparison per pair. Candidates are accepted when their
+    estimated Jaccard similarity reaches `threshold`.
+
+    Only canonical messages are indexed, so the index grows with the number of
+    distinct messages. It is kept across runs with save()/load() and updated by
+    every assign() call.
+    """
+
+    def __init__(self, num_perm=128, bands=32, threshold=0.7, shingle_size=3, min_words=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.version = INDEX_VERSION
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.hashes = {}        # content hash -> canonical key
+        self.signatures = {}    # canonical key -> MinHash signature
+        self.buckets = [{} for _ in range(bands)]  # per band: band bytes -> [canonical keys]
+
+    def signature(self, words):
+        hashes = shingle_hashes(words, self.shingle_size)
+        # uint64 products wrap around, as in the usual numpy MinHash implementations
+        with np.errstate(over='ignore'):
+            permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _match(self, signature, band_keys):
+        """Best indexed canonical key for the signature, or None below the threshold."""
+        candidates = set()
+        for buckets, key in zip(self.buckets, band_keys):
+            candidates.update(buckets.get(key, ()))
+        best_id, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = np.count_nonzero(self.signatures[candidate] == signature) / len(signature)
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate, similarity
+        return best_id
+
+    def add(self, key, text):
+        """Index one message under `key` (its (channel, id)) and return its canonical key."""
+        words = normalize_words(text)
+        if len(words) < self.min_words:
+            return key
+        digest = content_hash(words)
+        canonical_key = self.hashes.get(digest)
+        if canonical_key is not None:
+            return canonical_key
+
+        signature = self.signature(words)
+        band_keys = self._band_keys(signature)
+        canonical_key = self._match(signature, band_keys)
+        if canonical_key is None:
+            canonical_key = key
+            self.signatures[key] = signature
+            for buckets, band_key in zip(self.buckets, band_keys):
+                buckets.setdefault(band_key, []).append(key)
+        self.hashes[digest] = canonical_key
+        return canonical_key
+
+    def assign(self, df, text_column='message', id_column='id', channel_column='channel'):
+        """Return canonical_channel and canonical_id columns for df, indexing its rows in order.
+
+        Without a `channel_column` in df, all rows are treated as one channel
+        and canonical_channel is None.
+        """
+        start = time.perf_counter()
+        channels = df[channel_column] if channel_column in df.columns else [None] * len(df)
+        keys = list(zip(channels, df[id_column]))
+        canonical_keys = [self.add(key, text) for key, text in zip(keys, df[text_column])]
+        canonical = pd.DataFrame(canonical_keys, index=df.index, columns=['canonical_channel', 'canonical_id'])
+        duplicates = sum(canonical_key != key for canonical_key, key in zip(canonical_keys, keys))
+        elapsed = time.perf_counter() - start
+        logging.info(
+            f"Assigned canonical ids to {len(df)} messages in {elapsed:.2f}s: {duplicates} duplicates, "
+            f"{len(self.signatures)} distinct messages indexed."
+        )
+        return canonical
+
+    def save(self, path):
+        """Write the index atomically, so an interrupted run leaves the previous one intact."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, **options):
+        """Load a saved index, or start an empty one with `options` if there is none yet or it is outdated."""
+        if not os.path.exists(path):
+            return cls(**options)
+        with open(path, 'rb') as f:
+            index = pickle.load(f)
+        if getattr(index, 'version', 1) != INDEX_VERSION:
+            logging.warning(f"Near-duplicate index {path} was built by an older version; starting a new one.")
+            return cls(**options)
+        return index
@@ -0,0 +1,81 @@
+import argparse
+import cv2
+import numpy as np
+import time
+from yolo_model import YOLOModel
+
+# YOLOv3-416 output rows per layer (13x13, 26x26 and 52x52 grids, 3 anchors each), 80 classes
+LAYER_ROWS = (507, 2028, 8112)
+NUM_CLASSES = 80
+
+def synthetic_outputs(rng, detection_rate=0.002):
+    """Random raw YOLO outputs: box values in [0, 1], a few rows scoring above the threshold."""
+    layers = []
+    for rows in LAYER_ROWS:
+        output = rng.random((rows, 5 + NUM_CLASSES), dtype=np.float32)
+        output[:, 2:4] *= 0.3
+        output[:, 5:] *= 0.4
+        hits = rng.random(rows) < detection_rate
+        output[hits, 5 + rng.integers(0, NUM_CLASSES, hits.sum())] = rng.uniform(0.5, 1.0, hits.sum())
+        layers.append(output)
+    return layers
+
+def postprocess_loop(classes, layer_outputs, width, height):
+    """The original per-row implementation, kept as the baseline."""
+    boxes, confidences, class_ids = [], [], []
+    for output in layer_outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = np.argmax(scores)
+            confidence = scores[class_id]
+            if confidence > 0.5:
+                center_x = int(detection[0] * width)
+                center_y = int(detection[1] * height)
+                w = int(detection[2] * width)
+                h = int(detection[3] * height)
+                x = int(center_x - w / 2)
+                y = int(center_y - h / 2)
+                boxes.append([x, y, w, h])
+                confidences.append(float(confidence))
+                class_ids.append(class_id)
+    indexes = cv2.dnn.NMSBoxes(boxes, confidences, score_threshold=0.5, nms_threshold=0.4)
+    detections = []
+    if len(indexes) > 0:
+        for i in indexes.flatten():
+            detections.append({
+                'class_id': int(class_ids[i]),
+                'label': str(classes[class_ids[i]]),
+                'confidence': confidences[i],
+                'box': boxes[i],
+            })
+    return detections
+
+def benchmark(images=50, seed=0, width=1280, height=720):
+    """Time per-image post-processing of the per-row loop and YOLOModel._postprocess on the same tensors."""
+    rng = np.random.default_rng(seed)
+    samples = [synthetic_outputs(rng) for _ in range(images)]
+
+    # Only the labels are needed for post-processing, so skip loading a network
+    model = YOLOModel.__new__(YOLOModel)
+    model.classes = [f"class_{i}" for i in range(NUM_CLASSES)]
+
+    start = time.perf_counter()
+    baseline = [postprocess_loop(model.classes, sample, width, height) for sample in samples]
+    loop_seconds = (time.perf_counter() - start) / images
+
+    start = time.perf_counter()
+    vectorized = [model._postprocess(sample, width, height) for sample in samples]
+    vectorized_seconds = (time.perf_counter() - start) / images
+
+    mismatches = sum(a != b for a, b in zip(baseline, vectorized))
+    print(f"Per-image post-processing over {images} images ({sum(LAYER_ROWS)} rows each):")
+    print(f"  per-row loop: {loop_seconds * 1000:.2f} ms")
+    print(f"  vectorized:   {vectorized_seconds * 1000:.2f} ms ({loop_seconds / vectorized_seconds:.0f}x faster)")
+    print(f"  images with different detections: {mismatches}")
+    return loop_seconds, vectorized_seconds, mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark YOLO post-processing on synthetic output tensors.")
+    parser.add_argument('--images', type=int, default=50, help="Number of synthetic images.")
+    args = parser.parse_args()
+    benchmark(args.images)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+def file_sha256(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def model_version(*paths, **settings):
+    """Identify a detector setup by the content of its model files and its settings (thresholds, input size)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_sha256(path).encode('ascii'))
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+class DetectionCache:
+    """Detection results kept in SQLite across runs, keyed by image content hash and model version.
+
+    `detections` holds the results per (sha256, model_version), so an image is
+    only run through the model once per model version, whatever its filename.
+    `files` records each image path already fully handled (results stored in
+    the summary/DB/output folder) with its size, mtime and hash; a file whose
+    size and mtime still match is treated as unchanged without being re-hashed.
+    """
+
+    def __init__(self, path, model_version):
+        self.model_version = model_version
+        # Lookups and writes may happen on different threads (e.g. a pipeline's
+        # persist stage), but never at the same time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('''
+        CREATE TABLE IF NOT EXISTS detections (
+            sha256 TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            detections TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (sha256, model_version)
+        )
+        ''')
+        self.connection.execute('''
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (path, model_version)
+        )
+        ''')
+        self.connection.commit()
+        self.unchanged = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, image_path):
+        """Return (sha256, detections, unchanged) for an image.
+
+        `detections` is None when the content has not been run through this
+        model version yet. `unchanged` is True when the file was already
+        handled by an earlier run and has not changed since.
+        """
+        stat = os.stat(image_path)
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, sha256 FROM files WHERE path = ? AND model_version = ?',
+            (image_path, self.model_version),
+        ).fetchone()
+        known = row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns
+        sha256 = row[2] if known else file_sha256(image_path)
+        detections = self.get(sha256)
+        if detections is None:
+            self.misses += 1
+            return sha256, None, False
+        if known:
+            self.unchanged += 1
+        else:
+            self.hits += 1
+        return sha256, detections, known
+
+    def get(self, sha256):
+        row = self.connection.execute(
+            'SELECT detections FROM detections WHERE sha256 = ? AND model_version = ?',
+            (sha256, self.model_version),
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, sha256, detections):
+        """Store the model's detections for an image's content."""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO detections (sha256, model_version, detections, created_at) VALUES (?, ?, ?, ?)',
+            (sha256, self.model_version, json.dumps(detections), datetime.now(timezone.utc).isoformat()),
+        )
+        self.connection.commit()
+
+    def record(self, image_path, sha256):
+        """Mark an image as handled, once its results have been stored downstream."""
+        stat = os.stat(image_path)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files (path, model_version, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?)',
+            (image_path, self.model_version, stat.st_size, stat.st_mtime_ns, sha256),
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+        logging.info(
+            f"Detection cache: {self.unchanged} unchanged images skipped, {self.hits} new files with cached results, "
+            f"{self.misses} images needing inference."
+        )
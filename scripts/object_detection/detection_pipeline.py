@@ -0,0 +1,180 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+def _put(q, item, stop):
+    """Put with backpressure, giving up if the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+class Stage:
+    """One pipeline step, run by its own thread between two bounded queues.
+
+    `func(item)` returns the item to pass on, or None to drop it. With an
+    `executor`, func runs there with up to `inflight` items outstanding, and
+    results are still passed on in input order.
+
+    Stats: `busy_seconds` is time spent in func (or waiting for the executor),
+    `starved_seconds` time waiting for input, `blocked_seconds` time waiting
+    for room in the next queue (backpressure from the stages after it).
+    """
+
+    def __init__(self, name, func, executor=None, inflight=1):
+        self.name = name
+        self.func = func
+        self.executor = executor
+        self.inflight = max(1, inflight)
+        self.items = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.starved_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def stats(self):
+        return {
+            'items': self.items, 'dropped': self.dropped, 'busy_seconds': self.busy_seconds,
+            'starved_seconds': self.starved_seconds, 'blocked_seconds': self.blocked_seconds,
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+    def _emit(self, result, outbox, stop):
+        self.items += 1
+        if result is None:
+            self.dropped += 1
+            return
+        start = time.perf_counter()
+        _put(outbox, result, stop)
+        self.blocked_seconds += time.perf_counter() - start
+
+    def _resolve(self, future):
+        start = time.perf_counter()
+        result = future.result()
+        self.busy_seconds += time.perf_counter() - start
+        return result
+
+    def _run(self, inbox, outbox, stop, errors):
+        pending = deque()
+        try:
+            while True:
+                start = time.perf_counter()
+                item = _get(inbox, stop)
+                self.starved_seconds += time.perf_counter() - start
+                if item is _DONE:
+                    break
+                self.max_queue_depth = max(self.max_queue_depth, inbox.qsize() + 1)
+                if self.executor is None:
+                    start = time.perf_counter()
+                    result = self.func(item)
+                    self.busy_seconds += time.perf_counter() - start
+                    self._emit(result, outbox, stop)
+                else:
+                    pending.append(self.executor.submit(self.func, item))
+                    if len(pending) >= self.inflight:
+                        self._emit(self._resolve(pending.popleft()), outbox, stop)
+            while pending and not stop.is_set():
+                self._emit(self._resolve(pending.popleft()), outbox, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for future in pending:
+                future.cancel()
+            _put(outbox, _DONE, stop)
+
+def run_pipeline(items, stages, queue_size=8):
+    """Pass items through the stages, each in its own thread, and return the last stage's outputs in input order.
+
+    Stages are connected by queues of at most `queue_size` items, so a slow
+    stage holds back the ones before it instead of letting work pile up in
+    memory. The first exception raised by a stage stops the pipeline and is
+    re-raised here.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    stop = threading.Event()
+    errors = []
+
+    def feed():
+        try:
+            for item in items:
+                if not _put(queues[0], item, stop):
+                    return
+            _put(queues[0], _DONE, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=feed, name='pipeline-feed', daemon=True)]
+    for i, stage in enumerate(stages):
+        threads.append(threading.Thread(
+            target=stage._run, args=(queues[i], queues[i + 1], stop, errors), name=f"pipeline-{stage.name}", daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+
+    results = []
+    try:
+        while True:
+            item = _get(queues[-1], stop)
+            if item is _DONE:
+                break
+            results.append(item)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+def log_stage_stats(stages, elapsed):
+    """Log per-stage timing; the stage with the most busy time is the bottleneck."""
+    for stage in stages:
+        logging.info(
+            f"Stage {stage.name}: {stage.items} items ({stage.dropped} dropped), {stage.busy_seconds:.2f}s busy, "
+            f"{stage.starved_seconds:.2f}s waiting for input, {stage.blocked_seconds:.2f}s blocked by the next stage, "
+            f"peak queue depth {stage.max_queue_depth}."
+        )
+    bottleneck = max(stages, key=lambda stage: stage.busy_seconds)
+    logging.info(f"Pipeline finished in {elapsed:.2f}s; bottleneck stage: {bottleneck.name}.")
+
+# Model held by each inference worker process
+_worker_model = None
+
+def _init_model_worker(factory, args):
+    global _worker_model
+    _worker_model = factory(*args)
+
+def detect_in_worker(image):
+    """Run the worker process's model on one image."""
+    return _worker_model.detect_objects(image)
+
+def start_model_workers(factory, args, workers):
+    """Start `workers` processes that each build their own model with factory(*args).
+
+    Submit images with executor.submit(detect_in_worker, image). The factory
+    must be importable (a module-level function or class) so that it can be
+    sent to the workers.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_model_worker, initargs=(factory, args))
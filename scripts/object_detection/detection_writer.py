@@ -0,0 +1,181 @@
+import logging
+import os
+import time
+
+# Warehouse database holding the Image_detection table; the same database as
+# the API's DATABASE_URL, whose /detections routes and rollups read it
+DB_CONFIG = {
+    'dbname': "Ethiopian_Medical_Data",
+    'user': "postgres",
+    'password': "admin",
+    'host': "localhost",
+    'port': "5432",
+}
+
+INSERT_COLUMNS = ['filename', 'channel', 'message_id', 'class_id', 'confidence', 'x_min', 'y_min', 'width', 'height']
+
+# Same layout as the API's ImageDetection model, for when the detector runs before the API created it
+CREATE_TABLE = [
+    '''
+    CREATE TABLE IF NOT EXISTS image_detection (
+        id SERIAL PRIMARY KEY,
+        filename VARCHAR(255),
+        channel VARCHAR(255),
+        message_id BIGINT,
+        class_id INTEGER,
+        confidence DOUBLE PRECISION,
+        x_min INTEGER,
+        y_min INTEGER,
+        width INTEGER,
+        height INTEGER
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS ix_image_detection_filename ON image_detection (filename)",
+    "CREATE INDEX IF NOT EXISTS ix_image_detection_channel ON image_detection (channel)",
+    # Messages whose detections were replaced, so the rollups can recompute their days
+    # even when a rerun leaves fewer (or no) rows behind; same layout as ImageDetectionChange
+    '''
+    CREATE TABLE IF NOT EXISTS image_detection_changes (
+        id SERIAL PRIMARY KEY,
+        channel VARCHAR(255),
+        message_id BIGINT
+    )
+    ''',
+]
+
+def parse_media_filename(filename):
+    """Split a scraped media filename '{channel}_{message_id}.jpg' into (channel, message_id)."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    channel, _, message_id = stem.rpartition('_')
+    if not channel or not message_id.isdigit():
+        return None, None
+    return channel, int(message_id)
+
+def detection_rows(filename, detections):
+    """Image_detection rows for one file's detections."""
+    # Keep the source message so detections can be joined to messages
+    channel, message_id = parse_media_filename(filename)
+    return [
+        (filename, channel, message_id, detection['class_id'], detection['confidence'], *detection['box'])
+        for detection in detections
+    ]
+
+class DetectionWriter:
+    """Collects detections across images and writes them to Image_detection in batches.
+
+    A batch is written once it holds `batch_size` rows or files, and on
+    flush()/close(). Each batch is one transaction that deletes the files'
+    existing rows and inserts the new ones with execute_values, so a file's
+    rows are replaced rather than appended and retrying a batch (even one
+    whose commit went through before the connection dropped) never
+    duplicates rows. The batch also logs each file's (channel, message_id)
+    to image_detection_changes, which the API's rollup refresh consumes to
+    recompute the affected days. Connections come from a pool opened on first use; a
+    connection that fails is discarded and the batch is retried up to
+    `retries` times with a growing delay.
+
+    `on_written` callbacks passed to add() run once the file's rows are
+    committed. A batch that still fails is logged and dropped without
+    calling them, so callers can leave those files to the next run.
+    """
+
+    def __init__(self, config, batch_size=1000, retries=3, retry_delay=1.0, max_connections=2):
+        self.config = config
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_connections = max_connections
+        self.pool = None
+        self.table_ready = False
+        self.files = {}
+        self.rows = 0
+        self.written_files = 0
+        self.written_rows = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.write_seconds = 0.0
+
+    def add(self, filename, detections, on_written=None):
+        """Queue a file's detections (replacing any queued earlier for the same file)."""
+        previous = self.files.pop(filename, None)
+        if previous is not None:
+            self.rows -= len(previous[0])
+        rows = detection_rows(filename, detections)
+        self.files[filename] = (rows, on_written)
+        self.rows += len(rows)
+        if self.rows >= self.batch_size or len(self.files) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the queued files as one batch; returns False if it failed after all retries."""
+        if not self.files:
+            return True
+        files, self.files, self.rows = self.files, {}, 0
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                self._write_batch(files)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    self.failed_batches += 1
+                    logging.error(f"Database error, dropping a batch of {len(files)} files after {attempt + 1} attempts: {e}")
+                    self.write_seconds += time.perf_counter() - start
+                    return False
+                delay = self.retry_delay * 2 ** attempt
+                logging.warning(f"Database error, retrying the batch in {delay:.1f}s: {e}")
+                time.sleep(delay)
+        self.write_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.written_files += len(files)
+        self.written_rows += sum(len(rows) for rows, _ in files.values())
+        logging.info(f"Detections for {len(files)} files inserted into the Image_detection table.")
+        for rows, on_written in files.values():
+            if on_written is not None:
+                on_written()
+        return True
+
+    def close(self):
+        """Write whatever is still queued and close the pooled connections."""
+        try:
+            self.flush()
+        finally:
+            if self.pool is not None:
+                self.pool.closeall()
+            logging.info(
+                f"DetectionWriter: {self.written_rows} detections for {self.written_files} files in {self.batches} batches "
+                f"({self.failed_batches} failed, {self.write_seconds:.2f}s writing)."
+            )
+
+    def _write_batch(self, files):
+        from psycopg2.extras import execute_values
+        from psycopg2.pool import ThreadedConnectionPool
+
+        if self.pool is None:
+            self.pool = ThreadedConnectionPool(1, self.max_connections, **self.config)
+        connection = self.pool.getconn()
+        try:
+            with connection.cursor() as cursor:
+                if not self.table_ready:
+                    for statement in CREATE_TABLE:
+                        cursor.execute(statement)
+                # Drop rows from earlier versions of the files, in the same transaction
+                cursor.execute("DELETE FROM Image_detection WHERE filename = ANY(%s)", (list(files),))
+                rows = [row for file_rows, _ in files.values() for row in file_rows]
+                if rows:
+                    execute_values(
+                        cursor, f"INSERT INTO Image_detection ({', '.join(INSERT_COLUMNS)}) VALUES %s", rows, page_size=len(rows)
+                    )
+                changes = [parse_media_filename(filename) for filename in files]
+                changes = [change for change in changes if change[0] is not None]
+                if changes:
+                    execute_values(
+                        cursor, "INSERT INTO image_detection_changes (channel, message_id) VALUES %s", changes, page_size=len(changes)
+                    )
+            connection.commit()
+            self.table_ready = True
+        except Exception:
+            # The connection may be broken; don't hand it out again
+            self.pool.putconn(connection, close=True)
+            raise
+        self.pool.putconn(connection)
@@ -0,0 +1,128 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from detection_cache import file_sha256
+
+# YOLOv5 input size used for exported models
+EXPORT_INPUT_SIZE = (640, 640)
+ONNX_OPSET = 12
+
+def _write_json(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+class ModelRegistry:
+    """Local store of YOLOv5 weights exports, keyed by the weights' SHA-256.
+
+    Nothing is downloaded: PyTorch models are loaded with torch.hub from a
+    local YOLOv5 checkout (`yolov5_dir`, by default the copy torch.hub cached
+    on an earlier online run), and ONNX exports are made once per weights
+    file and reused from <root>/<sha256[:16]>/. Weights hashes are remembered
+    by path, size and mtime in <root>/index.json, so a restart does not re-read
+    the weights to find its export.
+    """
+
+    def __init__(self, root, yolov5_dir=None):
+        self.root = root
+        self.yolov5_dir = yolov5_dir
+        os.makedirs(root, exist_ok=True)
+        self.index_path = os.path.join(root, 'index.json')
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def weights_hash(self, weights_path):
+        """SHA-256 of the weights, re-computed only when the file's size or mtime changed."""
+        weights_path = os.path.abspath(weights_path)
+        stat = os.stat(weights_path)
+        entry = self.index.get(weights_path)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+        sha256 = file_sha256(weights_path)
+        self.index[weights_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        _write_json(self.index_path, self.index)
+        return sha256
+
+    def model_dir(self, weights_path):
+        return os.path.join(self.root, self.weights_hash(weights_path)[:16])
+
+    def _hub_dir(self):
+        import torch
+
+        hub_dir = self.yolov5_dir or os.path.join(torch.hub.get_dir(), 'ultralytics_yolov5_master')
+        if not os.path.isfile(os.path.join(hub_dir, 'hubconf.py')):
+            raise FileNotFoundError(
+                f"No local YOLOv5 checkout at {hub_dir}; clone ultralytics/yolov5 there or pass yolov5_dir."
+            )
+        return hub_dir
+
+    def load_torch(self, weights_path, autoshape=True):
+        """Load the weights with torch.hub from the local YOLOv5 checkout, without network access."""
+        import torch
+
+        return torch.hub.load(self._hub_dir(), 'custom', path=weights_path, source='local', autoshape=autoshape, verbose=False)
+
+    def onnx_path(self, weights_path, input_size=EXPORT_INPUT_SIZE):
+        """Path of the weights' ONNX export, exporting it first if this registry has none yet."""
+        path = os.path.join(self.model_dir(weights_path), f"model-{input_size[0]}x{input_size[1]}.onnx")
+        if not os.path.exists(path):
+            self.export_onnx(weights_path, path, input_size)
+        return path
+
+    def export_onnx(self, weights_path, path, input_size=EXPORT_INPUT_SIZE):
+        """Export the weights to ONNX with a single (1, rows, 5 + classes) output, as YOLOv5's export does."""
+        import torch
+
+        start = time.perf_counter()
+        logging.info(f"Exporting {weights_path} to ONNX...")
+        model = self.load_torch(weights_path, autoshape=False).model.float().eval()
+        for module in model.modules():
+            # YOLOv5's Detect head returns just the decoded predictions in export mode
+            if hasattr(module, 'export'):
+                module.export = True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model, torch.zeros(1, 3, input_size[1], input_size[0]), temp_path, opset_version=ONNX_OPSET,
+                input_names=['images'], output_names=['output0'],
+            )
+        os.replace(temp_path, path)
+        _write_json(os.path.join(os.path.dirname(path), 'meta.json'), {
+            'weights_path': os.path.abspath(weights_path),
+            'sha256': self.weights_hash(weights_path),
+            'input_size': list(input_size),
+            'opset': ONNX_OPSET,
+            'exported_at': datetime.now(timezone.utc).isoformat(),
+        })
+        logging.info(f"Exported {path} in {time.perf_counter() - start:.1f}s.")
+        return path
+
+    def load_onnx(self, weights_path, backend='opencv', input_size=EXPORT_INPUT_SIZE):
+        """Load the weights' ONNX export with OpenCV DNN ('opencv') or ONNX Runtime on CPU ('onnxruntime')."""
+        path = self.onnx_path(weights_path, input_size)
+        if backend == 'opencv':
+            import cv2
+
+            return cv2.dnn.readNetFromONNX(path)
+        if backend == 'onnxruntime':
+            import onnxruntime
+
+            return onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        raise ValueError(f"Unknown ONNX backend: {backend}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export YOLOv5 weights to ONNX once, into the local model registry.")
+    parser.add_argument('weights', help="YOLOv5 .pt weights file.")
+    parser.add_argument('--registry', default=None, help="Registry directory (default: model_registry next to the weights).")
+    parser.add_argument('--yolov5-dir', default=None, help="Local YOLOv5 checkout (default: the torch.hub cache).")
+    args = parser.parse_args()
+    registry = ModelRegistry(args.registry or os.path.join(os.path.dirname(os.path.abspath(args.weights)), 'model_registry'), args.yolov5_dir)
+    print(registry.onnx_path(args.weights))
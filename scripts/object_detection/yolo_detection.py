@@ -1,10 +1,14 @@
-import torch
+import argparse
 import cv2
 import numpy as np
 import os
 import logging
-import psycopg2
-from psycopg2 import sql
+import time
+from concurrent.futures import ThreadPoolExecutor
+from detection_cache import DetectionCache, model_version
+from detection_writer import DB_CONFIG, DetectionWriter
+from detection_pipeline import Stage, detect_in_worker, log_stage_stats, run_pipeline, start_model_workers
+from model_registry import EXPORT_INPUT_SIZE, ModelRegistry
 
 # Set up logging
 logging.basicConfig(
@@ -16,17 +20,32 @@ logging.basicConfig(
     ]
 )
 
+# Detection settings; part of the model version used by the detection cache
+CONFIDENCE_THRESHOLD = 0.25
+NMS_THRESHOLD = 0.45
+
+# 'torch' runs the .pt weights; 'opencv' and 'onnxruntime' run their cached ONNX export
+BACKENDS = ('torch', 'opencv', 'onnxruntime')
+
 class YOLOModel:
-    def __init__(self, weights_path, labels_path):
+    def __init__(self, weights_path, labels_path, backend='torch', registry_dir=None, yolov5_dir=None):
+        start = time.perf_counter()
+
         # Verify file paths
         if not os.path.isfile(weights_path):
             logging.error(f"File not found: {weights_path}")
             raise FileNotFoundError(f"File not found: {weights_path}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
 
-        # Load YOLOv5 model
-        logging.info("Loading YOLO model...")
+        # Load YOLOv5 model offline, from the local model registry
+        logging.info(f"Loading YOLO model ({backend})...")
+        registry = ModelRegistry(registry_dir or os.path.join(os.path.dirname(os.path.abspath(weights_path)), 'model_registry'), yolov5_dir)
         try:
-            self.model = torch.hub.load('ultralytics/yolov5', 'custom', path=weights_path)
+            if backend == 'torch':
+                self.model = registry.load_torch(weights_path)
+            else:
+                self.model = registry.load_onnx(weights_path, backend)
             logging.info("YOLO model loaded successfully.")
         except Exception as e:
             logging.error(f"Failed to load YOLO model: {e}")
@@ -41,9 +60,43 @@ class YOLOModel:
             self.classes = [line.strip() for line in f.readlines()]
         logging.info(f"Loaded {len(self.classes)} classes.")
 
-    def detect_objects(self, image, confidence_threshold=0.25):
+        # Kept so inference worker processes can load the same model
+        self.weights_path = weights_path
+        self.labels_path = labels_path
+        self.backend = backend
+        self.registry_dir = registry.root
+        self.yolov5_dir = yolov5_dir
+
+        # Identifies cached detections made with these files and settings
+        self.version = model_version(
+            labels_path, weights_sha256=registry.weights_hash(weights_path), backend=backend,
+            confidence_threshold=CONFIDENCE_THRESHOLD, nms_threshold=NMS_THRESHOLD,
+        )
+
+        self.startup_seconds = time.perf_counter() - start
+        self.first_inference_seconds = None
+        logging.info(f"Model ready in {self.startup_seconds:.2f}s.")
+
+    def detect_objects(self, image, confidence_threshold=CONFIDENCE_THRESHOLD):
         """Perform object detection on the image."""
         logging.info("Performing object detection...")
+        start = time.perf_counter()
+        if self.backend == 'torch':
+            detections = self._detect_torch(image, confidence_threshold)
+        else:
+            detections = self._detect_onnx(image, confidence_threshold)
+        if self.first_inference_seconds is None:
+            self.first_inference_seconds = time.perf_counter() - start
+            logging.info(f"First inference took {self.first_inference_seconds:.2f}s.")
+
+        if not detections:
+            logging.warning("No valid detections found.")
+        else:
+            logging.info(f"Detections found: {len(detections)}")
+        
+        return detections
+
+    def _detect_torch(self, image, confidence_threshold):
         results = self.model(image)  # Run inference
         detections = []
 
@@ -61,13 +114,41 @@ class YOLOModel:
                 'confidence': confidence,
                 'box': [x1, y1, x2 - x1, y2 - y1]  # box format: [x, y, width, height]
             })
+        return detections
 
-        if not detections:
-            logging.warning("No valid detections found.")
+    def _detect_onnx(self, image, confidence_threshold):
+        """Run the ONNX export and decode its (rows, 5 + classes) output: center box in input pixels, objectness, class scores."""
+        blob = cv2.dnn.blobFromImage(image, 1/255.0, EXPORT_INPUT_SIZE, swapRB=True, crop=False)
+        if self.backend == 'opencv':
+            self.model.setInput(blob)
+            output = self.model.forward()
         else:
-            logging.info(f"Detections found: {len(detections)}")
-        
-        return detections
+            output = self.model.run(None, {self.model.get_inputs()[0].name: blob})[0]
+        output = output.reshape(-1, output.shape[-1])
+
+        scores = output[:, 5:] * output[:, 4:5]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= confidence_threshold
+        output, class_ids, confidences = output[keep], class_ids[keep], confidences[keep]
+
+        # Scale boxes from the network input back to the image
+        scale_x = image.shape[1] / EXPORT_INPUT_SIZE[0]
+        scale_y = image.shape[0] / EXPORT_INPUT_SIZE[1]
+        w = output[:, 2] * scale_x
+        h = output[:, 3] * scale_y
+        x1 = output[:, 0] * scale_x - w / 2
+        y1 = output[:, 1] * scale_y - h / 2
+        boxes = np.stack([x1, y1, x1 + w, y1 + h], axis=1).astype(int)
+        boxes[:, 2:] -= boxes[:, :2]  # box format: [x, y, width, height]
+
+        # Per-class Non-Maximum Suppression, as YOLOv5 does
+        boxes, confidences, class_ids = boxes.tolist(), confidences.tolist(), class_ids.tolist()
+        indexes = cv2.dnn.NMSBoxesBatched(boxes, confidences, class_ids, confidence_threshold, NMS_THRESHOLD)
+        return [
+            {'class_id': class_ids[i], 'confidence': confidences[i], 'box': boxes[i]}
+            for i in np.asarray(indexes).flatten()
+        ]
 
     def draw_boxes(self, image, detections):
         """Draw detection boxes on the image."""
@@ -84,99 +165,166 @@ class YOLOModel:
             # Put label text
             cv2.putText(image, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-def insert_detections_to_db(detections, filename):
-    """Insert detection results into the PostgreSQL database."""
-    connection = None
-    cursor = None
-    try:
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(
-            dbname="Object_detection",
-            user="postgres",
-            password="admin",
-            host="localhost",
-            port="5432"
-        )
-        cursor = connection.cursor()
+def write_summary(summary_txt_path, results, classes):
+    """Write the summary of all images' detections, replacing the file atomically."""
+    temp_path = f"{summary_txt_path}.tmp"
+    with open(temp_path, 'w') as summary_file:
+        for filename, detections in results.items():
+            # Save labeled names to the summary text file
+            if detections:
+                for detection in detections:
+                    class_id = detection['class_id']
+                    confidence = detection['confidence']
+                    box = detection['box']
+                    label = classes[class_id]  # Get label from class_id
+                    summary_file.write(f"{filename}: {label} {confidence:.2f} {box[0]} {box[1]} {box[2]} {box[3]}\n")
+            else:
+                # If no detections, record that no objects were found
+                summary_file.write(f"{filename}: No detections found\n")
+    os.replace(temp_path, summary_txt_path)
 
-        # Insert detection data into the Image_detection table
-        insert_query = sql.SQL("INSERT INTO Image_detection (filename, class_id, confidence, x_min, y_min, width, height) VALUES (%s, %s, %s, %s, %s, %s, %s)")
-        
-        for detection in detections:
-            cursor.execute(insert_query, (
-                filename,
-                detection['class_id'],  # Use class_id directly
-                detection['confidence'],
-                detection['box'][0],  # x_min
-                detection['box'][1],  # y_min
-                detection['box'][2],  # width
-                detection['box'][3]   # height
-            ))
-
-        # Commit changes
-        connection.commit()
-        logging.info("Detections inserted into the Image_detection table successfully.")
-        
-    except Exception as e:
-        logging.error(f"Database error: {e}")
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
-            logging.info("Database connection closed.")
-
-def process_images(input_folder, output_folder, yolo, summary_txt_path):
-    """Process all images in the input folder and save the detections in the output folder."""
+def load_worker_model(weights_path, labels_path, backend='torch', registry_dir=None, yolov5_dir=None, threads=1):
+    """Model for an inference worker process, limited to `threads` threads so workers do not oversubscribe the CPU."""
+    if backend == 'torch':
+        import torch
+
+        torch.set_num_threads(threads)
+    else:
+        cv2.setNumThreads(threads)
+    return YOLOModel(weights_path, labels_path, backend, registry_dir, yolov5_dir)
+
+def process_images(input_folder, output_folder, yolo, summary_txt_path, cache_path=None,
+                   infer_workers=0, decode_workers=2, queue_size=8, writer=None, save_annotated=False):
+    """Detect objects in the new or changed images in the input folder and store the detections.
+
+    Results are cached by image content and model version (see DetectionCache,
+    by default next to the summary file). Only new or changed images are run
+    through the model and written to the database; the summary is rewritten
+    from the cache and covers every image in the folder. Annotated copies are
+    only written to the output folder with `save_annotated`; the API renders
+    them on demand from the stored boxes instead.
+
+    Images go through a pipeline of decode -> infer -> (annotate/encode) ->
+    persist stages connected by queues of `queue_size` images, so reading,
+    inference and writing overlap. With `infer_workers` > 0, inference runs in
+    that many processes, each loading its own model; otherwise it uses `yolo`.
+    Images are persisted in filename order either way.
+
+    Detections are written to the database in batches by `writer` (a
+    DetectionWriter on DB_CONFIG by default). An image is only marked as
+    done in the cache once its batch is committed, so images from a failed
+    batch are written again on the next run.
+    """
     # Check if input folder exists, create if not
     os.makedirs(input_folder, exist_ok=True)
 
     # Check if output folder exists, create if not
-    os.makedirs(output_folder, exist_ok=True)
+    if save_annotated:
+        os.makedirs(output_folder, exist_ok=True)
 
-    # Create a summary text file for all detections
-    with open(summary_txt_path, 'w') as summary_file:
-        # Iterate over each image in the input folder
-        for filename in os.listdir(input_folder):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-                image_path = os.path.join(input_folder, filename)
-                logging.info(f"Processing image: {image_path}")
-
-                # Load image
-                image = cv2.imread(image_path)
-                if image is None:
-                    logging.warning(f"Could not read image: {image_path}. Skipping.")
-                    continue
-
-                # Perform object detection
-                detections = yolo.detect_objects(image)
-
-                # Draw boxes on the image
-                yolo.draw_boxes(image, detections)
-
-                # Save the output image
-                output_path = os.path.join(output_folder, filename)
-                cv2.imwrite(output_path, image)
-                logging.info(f"Detected image saved to: {output_path}")
-
-                # Save labeled names to the summary text file
-                if detections:
-                    for detection in detections:
-                        class_id = detection['class_id']
-                        confidence = detection['confidence']
-                        box = detection['box']
-                        label = yolo.classes[class_id]  # Get label from class_id
-                        summary_file.write(f"{filename}: {label} {confidence:.2f} {box[0]} {box[1]} {box[2]} {box[3]}\n")
+    cache_path = cache_path or os.path.join(os.path.dirname(os.path.abspath(summary_txt_path)), 'detection_cache.sqlite')
+    cache = DetectionCache(cache_path, yolo.version)
+    own_writer = writer is None
+    writer = writer or DetectionWriter(DB_CONFIG)
+    results = {}
+    tasks = []
+    for filename in sorted(os.listdir(input_folder)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+            image_path = os.path.join(input_folder, filename)
+            sha256, detections, unchanged = cache.lookup(image_path)
+            if unchanged:
+                results[filename] = detections
+            else:
+                tasks.append({'filename': filename, 'path': image_path, 'sha256': sha256, 'detections': detections, 'cached': detections is not None})
+
+    workers = start_model_workers(
+        load_worker_model, (yolo.weights_path, yolo.labels_path, yolo.backend, yolo.registry_dir, yolo.yolov5_dir), infer_workers,
+    ) if infer_workers > 0 else None
+
+    def decode(task):
+        logging.info(f"Processing image: {task['path']}")
+        if task['cached'] and not save_annotated:
+            # Known content under a new name: only its database rows are needed
+            return task
+
+        # Load image
+        task['image'] = cv2.imread(task['path'])
+        if task['image'] is None:
+            logging.warning(f"Could not read image: {task['path']}. Skipping.")
+            return None
+        return task
+
+    def infer(task):
+        # Perform object detection, unless this content was already seen under another name
+        if not task['cached']:
+            if workers is not None:
+                task['detections'] = workers.submit(detect_in_worker, task['image']).result()
+            else:
+                task['detections'] = yolo.detect_objects(task['image'])
+        return task
+
+    def annotate(task):
+        # Draw boxes on the image and encode it in the input's format
+        image = task.pop('image')
+        yolo.draw_boxes(image, task['detections'])
+        encoded, buffer = cv2.imencode(os.path.splitext(task['filename'])[1], image)
+        if not encoded:
+            logging.warning(f"Could not encode image: {task['path']}. Skipping.")
+            return None
+        task['encoded'] = buffer
+        return task
+
+    def persist(task):
+        filename, detections = task['filename'], task['detections']
+        task.pop('image', None)
+        if not task['cached']:
+            cache.put(task['sha256'], detections)
+        if not detections:
+            logging.info(f"No detections for {filename}.")
+
+        # Save the output image
+        if save_annotated:
+            output_path = os.path.join(output_folder, filename)
+            with open(output_path, 'wb') as f:
+                f.write(task['encoded'].tobytes())
+            logging.info(f"Detected image saved to: {output_path}")
+
+        # Queue detections for the database; the image counts as done once they are committed
+        writer.add(filename, detections, on_written=lambda: cache.record(task['path'], task['sha256']))
+        return filename, detections
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=decode_workers) as decode_pool, \
+            ThreadPoolExecutor(max_workers=max(1, infer_workers)) as infer_pool:
+        stages = [
+            Stage('decode', decode, decode_pool, inflight=2 * decode_workers),
+            Stage('infer', infer, infer_pool if workers is not None else None, inflight=2 * infer_workers),
+        ]
+        if save_annotated:
+            stages.append(Stage('annotate', annotate))
+        stages.append(Stage('persist', persist))
+        try:
+            results.update(run_pipeline(tasks, stages, queue_size))
+        finally:
+            if workers is not None:
+                workers.shutdown(cancel_futures=True)
+            try:
+                if own_writer:
+                    writer.close()
                 else:
-                    # If no detections, record that no objects were found
-                    summary_file.write(f"{filename}: No detections found\n")
-                    logging.info(f"No detections for {filename}.")
+                    writer.flush()
+            finally:
+                cache.close()
+    elapsed = time.perf_counter() - start
+    log_stage_stats(stages, elapsed)
 
-                logging.info(f"Detection results for {filename} saved to the summary file.")
-                
-                # Insert detections into the database
-                insert_detections_to_db(detections, filename)
+    # Create a summary text file for all detections
+    write_summary(summary_txt_path, dict(sorted(results.items())), yolo.classes)
+    logging.info(f"Detection results for {len(results)} images saved to the summary file.")
+    return {
+        'images': len(tasks), 'seconds': elapsed, 'startup_seconds': yolo.startup_seconds,
+        'first_inference_seconds': yolo.first_inference_seconds, 'stages': {stage.name: stage.stats() for stage in stages},
+    }
 
 if __name__ == "__main__":
     # Replace these with the correct file paths
@@ -186,10 +334,23 @@ if __name__ == "__main__":
     output_folder = "C:/Users/hayyu.ragea/AppData/Local/Programs/Python/Python312/Ethiopian_Medical_Data/output_images"
     summary_txt_path = "C:/Users/hayyu.ragea/AppData/Local/Programs/Python/Python312/Ethiopian_Medical_Data/detection_summary.txt"
 
+    parser = argparse.ArgumentParser(description="Run YOLOv5 detection over a folder of images and store the results.")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help="Run the .pt weights with torch, or their cached ONNX export.")
+    parser.add_argument('--yolov5-dir', default=None, help="Local YOLOv5 checkout (default: the torch.hub cache).")
+    parser.add_argument('--infer-workers', type=int, default=0, help="Inference processes, each with its own model (0: run in this process).")
+    parser.add_argument('--decode-workers', type=int, default=2, help="Threads reading images ahead of inference.")
+    parser.add_argument('--save-annotated', action='store_true', help="Also write annotated copies of the images to the output folder.")
+    parser.add_argument('--queue-size', type=int, default=8, help="Images buffered between pipeline stages.")
+    args = parser.parse_args()
+
     # Initialize YOLO model
     try:
-        yolo_model = YOLOModel(weights_path, labels_path)
+        yolo_model = YOLOModel(weights_path, labels_path, args.backend, yolov5_dir=args.yolov5_dir)
         # Process the images
-        process_images(input_folder, output_folder, yolo_model, summary_txt_path)
+        process_images(
+            input_folder, output_folder, yolo_model, summary_txt_path,
+            infer_workers=args.infer_workers, decode_workers=args.decode_workers, queue_size=args.queue_size,
+            save_annotated=args.save_annotated,
+        )
     except Exception as e:
         logging.error(f"An error occurred during processing: {e}")
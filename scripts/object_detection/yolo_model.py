@@ -1,11 +1,22 @@
+import argparse
 import cv2
 import numpy as np
 import os
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from detection_cache import DetectionCache, model_version
+from detection_writer import DB_CONFIG, DetectionWriter
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Detection settings; they are part of the model version used by the detection cache
+INPUT_SIZE = (416, 416)
+CONFIDENCE_THRESHOLD = 0.5
+NMS_THRESHOLD = 0.4
+
 class YOLOModel:
     def __init__(self, weights_path, config_path, labels_path):
         # Verify file paths
@@ -32,62 +43,78 @@ class YOLOModel:
             logging.error(f"Error in processing output layers: {e}")
             raise
         logging.info("Model initialized with output layers and labels.")
+        
+        # Identifies cached detections made with these files and settings
+        self.version = model_version(
+            weights_path, config_path, labels_path, input_size=INPUT_SIZE,
+            confidence_threshold=CONFIDENCE_THRESHOLD, nms_threshold=NMS_THRESHOLD,
+        )
 
     def detect_objects(self, image):
         """Perform object detection on the image."""
-        height, width, _ = image.shape
-        
-        # Prepare image for YOLO
-        logging.info("Preparing image for YOLO detection.")
-        blob = cv2.dnn.blobFromImage(image, 1/255.0, (416, 416), swapRB=True, crop=False)
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        """Perform object detection on a list of images with a single forward pass."""
+        # Prepare images for YOLO
+        blob = cv2.dnn.blobFromImages(images, 1/255.0, INPUT_SIZE, swapRB=True, crop=False)
         self.net.setInput(blob)
         
         # Perform forward pass
-        logging.info("Running forward pass for object detection.")
+        logging.info(f"Running forward pass for object detection on {len(images)} images.")
         layer_outputs = self.net.forward(self.output_layers)
         
-        # Initialize detection lists
-        boxes, confidences, class_ids = [], [], []
+        # Outputs are (rows, 85) for one image and (batch, rows, 85) for several
+        layer_outputs = [output.reshape(len(images), -1, output.shape[-1]) for output in layer_outputs]
+        return [
+            self._postprocess([output[i] for output in layer_outputs], image.shape[1], image.shape[0])
+            for i, image in enumerate(images)
+        ]
+
+    def _postprocess(self, layer_outputs, width, height, confidence_threshold=CONFIDENCE_THRESHOLD):
+        """Turn one image's raw YOLO outputs into NMS-filtered detections in pixel coordinates.
+
+        Thresholding, argmax and box decoding run on whole arrays; only the
+        boxes that survive NMS are turned into dicts.
+        """
+        outputs = np.vstack(layer_outputs)
+        scores = outputs[:, 5:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        
+        # Filter detections by confidence
+        keep = confidences > confidence_threshold
+        outputs, class_ids, confidences = outputs[keep], class_ids[keep], confidences[keep]
         
-        # Iterate through each output
-        for output in layer_outputs:
-            for detection in output:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                
-                # Filter detections by confidence
-                if confidence > 0.5:
-                    center_x = int(detection[0] * width)
-                    center_y = int(detection[1] * height)
-                    w = int(detection[2] * width)
-                    h = int(detection[3] * height)
-                    
-                    # Rectangle coordinates
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-                    
-                    boxes.append([x, y, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
+        # Rectangle coordinates, truncated like int() on the scalar values
+        center_x = (outputs[:, 0] * width).astype(np.int64)
+        center_y = (outputs[:, 1] * height).astype(np.int64)
+        w = (outputs[:, 2] * width).astype(np.int64)
+        h = (outputs[:, 3] * height).astype(np.int64)
+        boxes = np.stack([(center_x - w / 2).astype(np.int64), (center_y - h / 2).astype(np.int64), w, h], axis=1)
         
         # Apply Non-Maximum Suppression (NMS) to remove redundant overlapping boxes
-        indexes = cv2.dnn.NMSBoxes(boxes, confidences, score_threshold=0.5, nms_threshold=0.4)
+        boxes, confidences = boxes.tolist(), confidences.tolist()
+        indexes = cv2.dnn.NMSBoxes(boxes, confidences, score_threshold=confidence_threshold, nms_threshold=NMS_THRESHOLD)
         
         detections = []
-        if len(indexes) > 0:
-            for i in indexes.flatten():
-                x, y, w, h = boxes[i]
-                label = str(self.classes[class_ids[i]])
-                confidence = confidences[i]
-                detections.append({
-                    'label': label,
-                    'confidence': confidence,
-                    'box': [x, y, w, h]
-                })
+        for i in np.asarray(indexes).flatten():
+            detections.append({
+                'class_id': int(class_ids[i]),
+                'label': str(self.classes[class_ids[i]]),
+                'confidence': confidences[i],
+                'box': boxes[i]
+            })
         
         return detections
 
+    def with_class_ids(self, detections):
+        """Detections with their class_id, filled in from the label for results cached before it was stored."""
+        return [
+            detection if 'class_id' in detection else {**detection, 'class_id': self.classes.index(detection['label'])}
+            for detection in detections
+        ]
+
     def draw_boxes(self, image, detections):
         """Draw detection boxes on the image."""
         for detection in detections:
@@ -102,33 +129,131 @@ class YOLOModel:
             # Put label text
             cv2.putText(image, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-def process_images(input_folder, output_folder, yolo):
-    """Process all images in the input folder and save the detections in the output folder."""
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def iter_decoded_images(image_paths, decode_workers=4, prefetch=16):
+    """Yield (path, image) in order, decoding up to `prefetch` images ahead on a thread pool.
+
+    cv2.imread releases the GIL, so decoding overlaps with inference. Unreadable
+    images are yielded as None.
+    """
+    with ThreadPoolExecutor(max_workers=decode_workers) as executor:
+        pending = deque()
+        for path in image_paths:
+            pending.append((path, executor.submit(cv2.imread, path)))
+            if len(pending) >= prefetch:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+def iter_batches(decoded_images, batch_size):
+    """Group decoded images into lists of up to `batch_size`, skipping unreadable ones."""
+    batch = []
+    for image_path, image in decoded_images:
+        if image is None:
+            logging.warning(f"Could not read image: {image_path}. Skipping.")
+            continue
+        batch.append((image_path, image))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def process_images(input_folder, output_folder, yolo, batch_size=1, decode_workers=4, cache_path=None, save_annotated=False,
+                   writer=None):
+    """Detect objects in the new or changed images in the input folder and store the detections.
+
+    Detections are cached by image content and model version (see DetectionCache,
+    by default output_folder/detection_cache.sqlite), so unchanged images are
+    skipped and known content under a new name is not run through the model again.
+
+    Detections are written to the Image_detection table by `writer` (a
+    DetectionWriter on DB_CONFIG by default), where the API renders annotated
+    images from them. An image is only marked as done in the cache once its
+    rows are committed. Annotated copies are only written to the output folder
+    with `save_annotated`.
+    """
     # Check if output folder exists, create if not
     os.makedirs(output_folder, exist_ok=True)
+    cache = DetectionCache(cache_path or os.path.join(output_folder, 'detection_cache.sqlite'), yolo.version)
+    own_writer = writer is None
+    writer = writer or DetectionWriter(DB_CONFIG)
 
-    # Iterate over each image in the input folder
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+    def store(image_path, sha256, detections):
+        # The image counts as done once its rows are committed
+        writer.add(
+            os.path.basename(image_path), yolo.with_class_ids(detections),
+            on_written=lambda: cache.record(image_path, sha256),
+        )
+
+    start = time.perf_counter()
+    pending = {}
+    for filename in sorted(os.listdir(input_folder)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
             image_path = os.path.join(input_folder, filename)
-            logging.info(f"Processing image: {image_path}")
+            sha256, detections, unchanged = cache.lookup(image_path)
+            if not unchanged:
+                pending[image_path] = (sha256, detections)
+    skipped = cache.unchanged
+
+    inference_seconds = 0.0
+    processed = 0
+    inferred = 0
+    try:
+        if not save_annotated:
+            # Known content under a new name needs no decoding, only its database rows
+            for image_path, (sha256, detections) in list(pending.items()):
+                if detections is not None:
+                    store(image_path, sha256, detections)
+                    del pending[image_path]
+                    processed += 1
 
-            # Load image
-            image = cv2.imread(image_path)
-            if image is None:
-                logging.warning(f"Could not read image: {image_path}. Skipping.")
-                continue
+        for batch in iter_batches(iter_decoded_images(list(pending), decode_workers, prefetch=2 * batch_size), batch_size):
+            # Perform object detection on the images without cached results
+            misses = [(image_path, image) for image_path, image in batch if pending[image_path][1] is None]
+            if misses:
+                inference_start = time.perf_counter()
+                batch_detections = yolo.detect_batch([image for _, image in misses])
+                inference_seconds += time.perf_counter() - inference_start
+                for (image_path, _), detections in zip(misses, batch_detections):
+                    cache.put(pending[image_path][0], detections)
+                    pending[image_path] = (pending[image_path][0], detections)
+                inferred += len(misses)
 
-            # Perform object detection
-            detections = yolo.detect_objects(image)
+            for image_path, image in batch:
+                sha256, detections = pending[image_path]
+                if save_annotated:
+                    # Draw boxes on the image
+                    yolo.draw_boxes(image, detections)
 
-            # Draw boxes on the image
-            yolo.draw_boxes(image, detections)
+                    # Save the output image
+                    output_path = os.path.join(output_folder, os.path.basename(image_path))
+                    cv2.imwrite(output_path, image)
+                    logging.info(f"Detected image saved to: {output_path}")
+                store(image_path, sha256, detections)
+            processed += len(batch)
+    finally:
+        try:
+            if own_writer:
+                writer.close()
+            else:
+                writer.flush()
+        finally:
+            cache.close()
 
-            # Save the output image
-            output_path = os.path.join(output_folder, filename)
-            cv2.imwrite(output_path, image)
-            logging.info(f"Detected image saved to: {output_path}")
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    logging.info(
+        f"Processed {processed} new or changed images ({inferred} through the model, {skipped} unchanged skipped) "
+        f"in {elapsed:.2f}s ({rate:.2f} images/sec, batch size {batch_size}); {inference_seconds:.2f}s in inference."
+    )
+    return {
+        'images': processed, 'inferred': inferred, 'skipped': skipped, 'seconds': elapsed,
+        'images_per_second': rate, 'inference_seconds': inference_seconds,
+    }
 
 if __name__ == "__main__":
     # Replace these with the correct file paths
@@ -140,10 +265,17 @@ if __name__ == "__main__":
     input_folder = "C:/Users/hayyu.ragea/AppData/Local/Programs/Python/Python312/Ethiopian_Medical_Data/data/raw/telegram_data"
     output_folder = "C:/Users/hayyu.ragea/AppData/Local/Programs/Python/Python312/Ethiopian_Medical_Data/data/detected_images"
 
+    parser = argparse.ArgumentParser(description="Run YOLO object detection over a folder of images.")
+    parser.add_argument('--batch-size', type=int, default=1, help="Images per forward pass; measure before raising it, CPU gains depend on the core count.")
+    parser.add_argument('--decode-workers', type=int, default=4, help="Threads decoding images ahead of the model.")
+    parser.add_argument('--save-annotated', action='store_true', help="Also write annotated copies of the images to the output folder.")
+    parser.add_argument('--cache', default=None, help="Detection cache file (default: detection_cache.sqlite in the output folder).")
+    args = parser.parse_args()
+
     # Initialize the YOLO model
     yolo = YOLOModel(weights_path, config_path, labels_path)
 
     # Process all images in the input folder
-    process_images(input_folder, output_folder, yolo)
+    process_images(input_folder, output_folder, yolo, args.batch_size, args.decode_workers, args.cache, args.save_annotated)
 
     logging.info("Processing complete.")
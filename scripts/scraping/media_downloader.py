@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from rate_limiter import call_with_limit
+
+class MediaDownloader:
+    """Downloads message media with a pool of workers fed by a bounded queue.
+
+    Files are stored once per content under <media_dir>/blobs/<sha[:2]>/<sha>.jpg,
+    and a SQLite manifest maps each (channel, message_id) to its blob, so the same
+    image reposted under another id costs a download but no extra disk space.
+    With `link_names`, <media_dir>/<channel>_<id>.jpg is also created as a hard
+    link to the blob for tools that look files up by message.
+
+    The client only needs `download_media(media, file=bytes)`. Each download
+    takes a token from the shared rate limiter.
+    """
+
+    def __init__(self, client, limiter, media_dir, manifest_path=None, workers=4, queue_size=100, link_names=True):
+        self.client = client
+        self.limiter = limiter
+        self.media_dir = media_dir
+        self.workers = workers
+        self.link_names = link_names
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.tasks = []
+        self.manifest = sqlite3.connect(manifest_path or os.path.join(media_dir, 'media_manifest.sqlite'))
+        self.manifest.execute('''
+        CREATE TABLE IF NOT EXISTS media (
+            channel TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            downloaded_at TEXT NOT NULL,
+            PRIMARY KEY (channel, message_id)
+        )
+        ''')
+        self.manifest.execute('CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256)')
+        self.manifest.commit()
+        self.started = None
+        self.downloaded_files = 0
+        self.downloaded_bytes = 0
+        self.new_blobs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+
+    def blob_path(self, sha256):
+        return os.path.join(self.media_dir, 'blobs', sha256[:2], f"{sha256}.jpg")
+
+    def has(self, channel, message_id):
+        row = self.manifest.execute(
+            'SELECT 1 FROM media WHERE channel = ? AND message_id = ?', (channel, message_id)
+        ).fetchone()
+        return row is not None
+
+    async def start(self):
+        self.started = time.perf_counter()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, channel, message):
+        """Queue a message's media, waiting while the queue is full; already stored media is skipped."""
+        if self.has(channel, message.id):
+            self.skipped += 1
+            return
+        await self.queue.put((channel, message))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    async def close(self):
+        """Wait for the queued downloads, stop the workers and log the totals."""
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.manifest.close()
+        stats = self.stats()
+        logging.info(
+            f"Media downloads: {stats['downloaded_files']} files, {stats['new_blobs']} new blobs, "
+            f"{stats['skipped']} already stored, {stats['failed']} failed, {stats['bytes_per_second']:,.0f} bytes/sec, "
+            f"peak queue depth {stats['max_queue_depth']}."
+        )
+        return stats
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'downloaded_files': self.downloaded_files,
+            'downloaded_bytes': self.downloaded_bytes,
+            'new_blobs': self.new_blobs,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'bytes_per_second': self.downloaded_bytes / elapsed if elapsed > 0 else 0.0,
+        }
+
+    async def _worker(self):
+        while True:
+            channel, message = await self.queue.get()
+            try:
+                data = await call_with_limit(
+                    self.limiter,
+                    lambda: self.client.download_media(message.media, file=bytes),
+                    f"{channel} media {message.id}",
+                )
+                if data:
+                    self._store(channel, message.id, data)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Failed to download media for {channel} message ID {message.id}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def _store(self, channel, message_id, data):
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self.new_blobs += 1
+        if self.link_names:
+            name_path = os.path.join(self.media_dir, f"{channel}_{message_id}.jpg")
+            if not os.path.exists(name_path):
+                try:
+                    os.link(path, name_path)
+                except OSError as e:
+                    logging.warning(f"Could not link {name_path} to its blob: {str(e)}")
+        self.manifest.execute(
+            'INSERT OR REPLACE INTO media (channel, message_id, sha256, size, downloaded_at) VALUES (?, ?, ?, ?, ?)',
+            (channel, message_id, sha256, len(data), datetime.now(timezone.utc).isoformat()),
+        )
+        self.manifest.commit()
+        self.downloaded_files += 1
+        self.downloaded_bytes += len(data)
+        logging.info(f"Downloaded media for message ID: {message_id}")
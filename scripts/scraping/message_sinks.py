@@ -0,0 +1,284 @@
+import asyncio
+import csv
+import logging
+import os
+import time
+import uuid
+
+MESSAGE_COLUMNS = ['channel', 'message_id', 'date', 'sender_id', 'message', 'media']
+
+class MessageSink:
+    """Buffers scraped messages and writes them in batches.
+
+    A batch is written once `batch_size` messages are buffered or every
+    `flush_interval` seconds, whichever comes first, and on close(). Writes run
+    in a thread so the event loop keeps scraping meanwhile. A batch handed to
+    the thread is seen through even if the flushing task is cancelled (e.g. on
+    SIGINT), so it is never half written.
+
+    If a `checkpoint` (e.g. a ScrapeState with autosave off) is given, its
+    snapshot is taken together with the batch and saved only after the batch is
+    written, so the saved scrape progress never runs ahead of stored messages.
+
+    With a `csv_path`, each written batch is also appended to that CSV file
+    before the checkpoint is saved, so an interrupted run keeps the CSV in step
+    with the store. If the append fails, the batch is retried in full; the
+    MySQL and Postgres sinks skip rows they already hold.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=5.0, checkpoint=None, csv_path=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.checkpoint = checkpoint
+        self.csv_path = csv_path
+        self.buffer = []
+        self.lock = asyncio.Lock()
+        self.timer = None
+        self.written = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+        self.timer = asyncio.create_task(self._flush_periodically())
+
+    async def write(self, channel, records):
+        """Buffer one page of message records; usable as the scraper's on_page callback.
+
+        A full buffer is flushed before the page is added, never after, so a
+        caller cancelled while waiting has not handed the page over and will
+        fetch it again, and one that returns can checkpoint the page.
+        """
+        if len(self.buffer) >= self.batch_size:
+            await self.flush()
+        self.buffer.extend(records)
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buffer and self.checkpoint is None:
+                return
+            rows, self.buffer = self.buffer, []
+            snapshot = self.checkpoint.snapshot() if self.checkpoint is not None else None
+            start = time.perf_counter()
+            cancelled = False
+            try:
+                if rows:
+                    cancelled = await self._write(rows)
+            except Exception:
+                # Keep the rows for the next attempt
+                self.buffer = rows + self.buffer
+                raise
+            self.write_seconds += time.perf_counter() - start
+            if rows:
+                self.written += len(rows)
+                self.batches += 1
+            if snapshot is not None:
+                self.checkpoint.save(snapshot)
+            if cancelled:
+                raise asyncio.CancelledError
+
+    async def _write(self, rows):
+        """Write a batch (and append it to the CSV) in a thread; returns True if cancelled meanwhile."""
+        write = asyncio.ensure_future(asyncio.to_thread(self._write_rows, rows))
+        cancelled = False
+        while not write.done():
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                cancelled = True
+        write.result()
+        return cancelled
+
+    def _write_rows(self, rows):
+        self._write_batch(rows)
+        if self.csv_path:
+            append_csv(self.csv_path, rows)
+
+    async def close(self):
+        """Stop the timer, write whatever is still buffered and release the connection."""
+        if self.timer is not None:
+            self.timer.cancel()
+            await asyncio.gather(self.timer, return_exceptions=True)
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self._close)
+        logging.info(
+            f"{type(self).__name__}: wrote {self.written} messages in {self.batches} batches "
+            f"({self.write_seconds:.2f}s writing)."
+        )
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"{type(self).__name__} flush failed, will retry: {str(e)}")
+
+    def _open(self):
+        pass
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+class MemorySink(MessageSink):
+    """Keeps written messages in a list; for tests and dry runs."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.rows = []
+
+    def _write_batch(self, rows):
+        self.rows.extend(rows)
+
+def _csv_header(path):
+    """The column names in the first line of a CSV file, or None if it is missing or empty."""
+    if not os.path.exists(path):
+        return None
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), None)
+
+def append_csv(path, rows):
+    """Append message records to a CSV file, writing the header if the file is new.
+
+    A file written with other columns (e.g. before the channel column was
+    added) would get rows that don't line up with its header, so it is renamed
+    to <name>.legacy-<timestamp>.csv and a new file is started.
+    """
+    import pandas as pd
+
+    header = _csv_header(path)
+    if header is not None and header != MESSAGE_COLUMNS:
+        stem, extension = os.path.splitext(path)
+        legacy_path = f"{stem}.legacy-{time.strftime('%Y%m%d%H%M%S')}{extension}"
+        os.replace(path, legacy_path)
+        logging.warning(f"{path} has columns {header}, not {MESSAGE_COLUMNS}; moved it to {legacy_path}.")
+        header = None
+    pd.DataFrame(rows, columns=MESSAGE_COLUMNS).to_csv(path, mode='a', header=header is None, index=False)
+
+def _row_values(rows):
+    return [tuple(row[column] for column in MESSAGE_COLUMNS) for row in rows]
+
+class MySQLSink(MessageSink):
+    """INSERT IGNORE into the MySQL messages table, one multi-row statement per batch."""
+
+    def __init__(self, config, **options):
+        super().__init__(**options)
+        self.config = config
+        self.connection = None
+
+    def _open(self):
+        import mysql.connector
+
+        self.connection = mysql.connector.connect(**self.config)
+        cursor = self.connection.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            channel VARCHAR(255) NOT NULL,
+            message_id INT NOT NULL,
+            date DATETIME,
+            sender_id INT,
+            message TEXT,
+            media ENUM('Yes', 'No'),
+            PRIMARY KEY (channel, message_id)
+        )
+        ''')
+        self.connection.commit()
+        cursor.close()
+
+    def _write_batch(self, rows):
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+        values = [value for row in _row_values(rows) for value in row]
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"INSERT IGNORE INTO messages ({', '.join(MESSAGE_COLUMNS)}) VALUES {placeholders}", values
+            )
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+class PostgresSink(MessageSink):
+    """INSERT ... ON CONFLICT DO NOTHING into the Postgres messages table with execute_values."""
+
+    def __init__(self, dsn, **options):
+        super().__init__(**options)
+        self.dsn = dsn
+        self.connection = None
+
+    def _open(self):
+        import psycopg2
+
+        self.connection = psycopg2.connect(self.dsn)
+        with self.connection.cursor() as cursor:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                channel VARCHAR(255) NOT NULL,
+                message_id BIGINT NOT NULL,
+                date TIMESTAMPTZ,
+                sender_id BIGINT,
+                message TEXT,
+                media VARCHAR(3),
+                PRIMARY KEY (channel, message_id)
+            )
+            ''')
+        self.connection.commit()
+
+    def _write_batch(self, rows):
+        from psycopg2.extras import execute_values
+
+        try:
+            with self.connection.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO messages ({', '.join(MESSAGE_COLUMNS)}) VALUES %s ON CONFLICT (channel, message_id) DO NOTHING",
+                    _row_values(rows),
+                    page_size=len(rows),
+                )
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+class ParquetSink(MessageSink):
+    """Appends each batch as new files to a Parquet dataset partitioned by channel and day.
+
+    The layout matches the ETL staging area, so etl_pipeline.load_data can read it.
+    """
+
+    def __init__(self, dataset_path, **options):
+        super().__init__(**options)
+        self.dataset_path = dataset_path
+
+    def _write_batch(self, rows):
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        df = pd.DataFrame(rows, columns=MESSAGE_COLUMNS)
+        df['day'] = pd.to_datetime(df['date'], utc=True).dt.strftime('%Y-%m-%d')
+        os.makedirs(self.dataset_path, exist_ok=True)
+        ds.write_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            self.dataset_path,
+            format='parquet',
+            partitioning=['channel', 'day'],
+            partitioning_flavor='hive',
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+
+try:
+    from telethon.errors import FloodWaitError
+except ImportError:  # lets the scraper run against a fake client without telethon installed
+    class FloodWaitError(Exception):
+        def __init__(self, seconds):
+            super().__init__(f"A wait of {seconds} seconds is required")
+            self.seconds = seconds
+
+MAX_FLOOD_WAITS = 5
+
+class TokenBucket:
+    """Rate limiter shared by every channel task: `rate` requests per second, bursts up to `capacity`.
+
+    A FloodWait reported by Telegram pauses the whole bucket, since the limit
+    applies to the account rather than to the channel that hit it.
+    """
+
+    def __init__(self, rate=1.0, capacity=5):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Hold every request for `seconds` and restart with an empty bucket."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+async def call_with_limit(limiter, request, description):
+    """Run `request()` (a coroutine factory) under the limiter, waiting out FloodWait errors."""
+    for attempt in range(MAX_FLOOD_WAITS + 1):
+        await limiter.acquire()
+        try:
+            return await request()
+        except FloodWaitError as error:
+            if attempt == MAX_FLOOD_WAITS:
+                raise
+            logging.warning(f"FloodWait of {error.seconds}s on {description}, pausing all requests.")
+            limiter.pause(error.seconds)
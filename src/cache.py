@@ -0,0 +1,94 @@
+import hashlib
+import time
+from collections import OrderedDict, namedtuple
+
+# A cached response body with its ETag, extra headers and invalidation tags
+CacheEntry = namedtuple("CacheEntry", ["body", "etag", "headers", "tags", "expires_at"])
+
+class ResponseCache:
+    """In-process LRU cache of encoded responses, bounded by total body bytes and a TTL.
+
+    Entries are tagged with the tables they were built from so that writes can
+    drop every cached read of that table with `invalidate(tag)`.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._size = 0
+        # Bumped on every invalidation so responses built from stale reads are not stored
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generation(self, tags):
+        """Snapshot of the tag generations, taken before building a response."""
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key, body, headers=None, tags=(), generation=None):
+        """Store a response body and return its entry.
+
+        If `generation` was taken before the response was built and one of the
+        tags has been invalidated since, the entry is returned but not stored.
+        """
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = CacheEntry(body, etag, headers or {}, tuple(tags), time.monotonic() + self.ttl_seconds)
+        if len(body) > self.max_bytes:
+            return entry
+        if generation is not None and generation != self.generation(tags):
+            return entry
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, tag):
+        """Drop every entry built from `tag`."""
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+        for key in [key for key, entry in self._entries.items() if tag in entry.tags]:
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
@@ -1,15 +1,81 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import CleanedData
 from schemas import CleanedDataCreate
 
-def create_cleaned_data(db: Session, cleaned_data: CleanedDataCreate):
-    db_cleaned_data = CleanedData(**cleaned_data.dict())
+async def create_cleaned_data(db: AsyncSession, cleaned_data: CleanedDataCreate):
+    db_cleaned_data = CleanedData(**cleaned_data.model_dump())
     db.add(db_cleaned_data)
-    db.commit()
-    db.refresh(db_cleaned_data)
+    await db.commit()
+    await db.refresh(db_cleaned_data)
     return db_cleaned_data
 
-def get_cleaned_data(db: Session):
-    return db.query(CleanedData).all()
+async def bulk_create_cleaned_data(db: AsyncSession, items: list):
+    """Insert many records in one transaction and return their ids in input order.
+
+    SQLAlchemy batches an executemany INSERT ... RETURNING into multi-row
+    VALUES statements ("insertmanyvalues"), so this costs one round trip per
+    page of rows instead of one per record. Raises ValueError, before
+    inserting anything, if a row has a key that is not a column.
+    """
+    if not items:
+        return []
+    rows = [item.model_dump() for item in items]
+    # A key that is not a column would be dropped and leave an empty row behind
+    columns = set(CleanedData.__table__.columns.keys())
+    for index, row in enumerate(rows):
+        unknown = set(row) - columns
+        if unknown:
+            raise ValueError(f"Row {index} has keys that are not cleaned_data columns: {', '.join(sorted(unknown))}")
+    stmt = insert(CleanedData).returning(CleanedData.id, sort_by_parameter_order=True)
+    try:
+        result = await db.execute(stmt, rows)
+        ids = list(result.scalars())
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return ids
+
+def _filter_cleaned_data(query, name=None, min_age=None, max_age=None, recorded_from=None, recorded_to=None):
+    """Apply the optional column filters shared by the page and export queries."""
+    if name is not None:
+        query = query.filter(CleanedData.name == name)
+    if min_age is not None:
+        query = query.filter(CleanedData.age >= min_age)
+    if max_age is not None:
+        query = query.filter(CleanedData.age <= max_age)
+    if recorded_from is not None:
+        query = query.filter(CleanedData.date_recorded >= recorded_from)
+    if recorded_to is not None:
+        query = query.filter(CleanedData.date_recorded <= recorded_to)
+    return query
+
+async def get_cleaned_data(db: AsyncSession, after_id: int = None, limit: int = 100, order: str = "asc", **filters):
+    """Return one keyset page of cleaned data ordered by id.
+
+    `after_id` is the cursor returned with the previous page: the id of its last row.
+    Rows strictly past the cursor in the requested order are returned, so the
+    query only touches `limit` index entries no matter how deep the page is.
+    """
+    query = _filter_cleaned_data(select(CleanedData), **filters)
+    if order == "desc":
+        if after_id is not None:
+            query = query.filter(CleanedData.id < after_id)
+        query = query.order_by(CleanedData.id.desc())
+    else:
+        if after_id is not None:
+            query = query.filter(CleanedData.id > after_id)
+        query = query.order_by(CleanedData.id.asc())
+    result = await db.execute(query.limit(limit))
+    return result.scalars().all()
+
+async def stream_cleaned_data(db: AsyncSession, batch_size: int = 1000, order: str = "asc", **filters):
+    """Yield cleaned data rows in batches of `batch_size` from a server-side cursor."""
+    query = _filter_cleaned_data(select(CleanedData), **filters)
+    query = query.order_by(CleanedData.id.desc() if order == "desc" else CleanedData.id.asc())
+    result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+    async for batch in result.partitions():
+        yield batch
 
 # Additional CRUD operations (Update, Delete) can be added similarly
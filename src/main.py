@@ -1,18 +1,284 @@
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-from crud import create_cleaned_data, get_cleaned_data
-from schemas import CleanedDataRead, CleanedDataCreate
+import csv
+import io
+import json
+import os
+import time
+from datetime import date
+from urllib.parse import urlencode
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import ResponseCache
+from database import Base, engine, get_db
+from metrics import MetricsMiddleware, metrics
+from pydantic import ValidationError
+from crud import bulk_create_cleaned_data, create_cleaned_data, get_cleaned_data, stream_cleaned_data
+from models import CleanedData, DetectionDailyRollup, ImageDetection, MessageWeeklyRollup
+from rendering import get_image_detections, media_path, render_annotated_image
+from search import ensure_search_index, install_sqlite_functions, search_messages
+from rollups import ensure_rollup_watermarks, get_message_weekly_counts, get_top_detected_classes, refresh_rollups
+from schemas import (
+    BulkInsertResult,
+    BulkRowError,
+    CleanedDataRead,
+    CleanedDataCreate,
+    DetectionRollupRead,
+    MessageRollupRead,
+    MessageSearchResult,
+    RollupRefreshResult,
+)
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = [column.name for column in CleanedData.__table__.columns]
+
+# Read-through cache for the read routes, invalidated by writes to the tables they read
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "30")),
+)
+
+# Annotated images rendered on demand from stored detections, keyed by file, mtime and size
+image_cache = ResponseCache(
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(128 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("IMAGE_CACHE_TTL", "300")),
+)
+
+ROLLUP_TABLES = [DetectionDailyRollup.__tablename__, MessageWeeklyRollup.__tablename__]
+
+install_sqlite_functions(engine)
+
+@app.on_event("startup")
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(ensure_search_index)
+        await conn.run_sync(ensure_rollup_watermarks)
+
+def _cleaned_data_filters(
+    name: str = None,
+    min_age: int = None,
+    max_age: int = None,
+    recorded_from: date = None,
+    recorded_to: date = None,
+):
+    """Query parameters shared by the cleaned data list and export routes."""
+    return {
+        "name": name,
+        "min_age": min_age,
+        "max_age": max_age,
+        "recorded_from": recorded_from,
+        "recorded_to": recorded_to,
+    }
+
+async def _export_lines(batches, fmt):
+    """Encode batches of rows as NDJSON or CSV lines, one batch at a time."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+    async for batch in batches:
+        buffer = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(buffer)
+            for row in batch:
+                writer.writerow([getattr(row, column) for column in EXPORT_COLUMNS])
+        else:
+            for row in batch:
+                record = {column: getattr(row, column) for column in EXPORT_COLUMNS}
+                buffer.write(json.dumps(record, default=str) + "\n")
+        yield buffer.getvalue()
+
+def _etag_matches(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+async def _cached_json_response(request: Request, tags, build):
+    """Serve a JSON response from the cache, building and storing it on a miss.
+
+    `build` is a coroutine function returning (payload, headers). The cache key is
+    the route path plus the sorted, URL-encoded query parameters.
+    """
+    key = request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation(tags)
+        payload, headers = await build()
+        body = json.dumps(jsonable_encoder(payload)).encode("utf-8")
+        entry = response_cache.set(key, body, headers, tags, generation)
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(entry.body, media_type="application/json", headers={**entry.headers, "ETag": entry.etag})
+
+def _parse_bulk_body(body: bytes, content_type: str):
+    """Decode a bulk request body sent either as a JSON array or as NDJSON."""
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    payload = json.loads(body)
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of records")
+    return payload
 
 @app.post("/cleaned_data/", response_model=CleanedDataRead)
-async def create_cleaned_data_route(cleaned_data: CleanedDataCreate, db: Session = Depends(get_db)):
-    return create_cleaned_data(db=db, cleaned_data=cleaned_data)
+async def create_cleaned_data_route(cleaned_data: CleanedDataCreate, db: AsyncSession = Depends(get_db)):
+    db_cleaned_data = await create_cleaned_data(db=db, cleaned_data=cleaned_data)
+    response_cache.invalidate(CleanedData.__tablename__)
+    return db_cleaned_data
+
+@app.post("/cleaned_data/bulk", response_model=BulkInsertResult)
+async def bulk_create_cleaned_data_route(request: Request, db: AsyncSession = Depends(get_db)):
+    try:
+        records = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk body: {e}")
+
+    # Validate every row up front so one bad record does not abort the batch
+    items, errors = [], []
+    for index, record in enumerate(records):
+        try:
+            items.append(CleanedDataCreate.model_validate(record))
+        except ValidationError as e:
+            errors.append(BulkRowError(index=index, error=str(e)))
+
+    start = time.perf_counter()
+    try:
+        inserted_ids = await bulk_create_cleaned_data(db=db, items=items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    elapsed = time.perf_counter() - start
+    if inserted_ids:
+        response_cache.invalidate(CleanedData.__tablename__)
+    return BulkInsertResult(
+        inserted_ids=inserted_ids,
+        errors=errors,
+        elapsed_seconds=elapsed,
+        rows_per_second=len(inserted_ids) / elapsed if elapsed > 0 else 0.0,
+    )
 
 @app.get("/cleaned_data/", response_model=list[CleanedDataRead])
-async def read_cleaned_data(db: Session = Depends(get_db)):
-    return get_cleaned_data(db=db)
+async def read_cleaned_data(
+    request: Request,
+    after_id: int = None,
+    limit: int = Query(100, ge=1, le=1000),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    filters: dict = Depends(_cleaned_data_filters),
+    db: AsyncSession = Depends(get_db),
+):
+    async def build():
+        rows = await get_cleaned_data(db=db, after_id=after_id, limit=limit, order=order, **filters)
+        # Pass the last id back as the cursor for the next page
+        headers = {"X-Next-Cursor": str(rows[-1].id)} if len(rows) == limit else {}
+        return [CleanedDataRead.model_validate(row) for row in rows], headers
+
+    return await _cached_json_response(request, [CleanedData.__tablename__], build)
+
+@app.get("/cleaned_data/export")
+async def export_cleaned_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    filters: dict = Depends(_cleaned_data_filters),
+    db: AsyncSession = Depends(get_db),
+):
+    batches = stream_cleaned_data(db=db, batch_size=EXPORT_BATCH_SIZE, order=order, **filters)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(_export_lines(batches, format), media_type=media_type)
+
+@app.get("/analytics/top_classes", response_model=list[DetectionRollupRead])
+async def read_top_detected_classes(
+    request: Request,
+    channel: str = None,
+    day_from: date = None,
+    day_to: date = None,
+    top: int = Query(5, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    async def build():
+        rows = await get_top_detected_classes(db=db, channel=channel, day_from=day_from, day_to=day_to, top=top)
+        return [DetectionRollupRead.model_validate(row) for row in rows], {}
+
+    return await _cached_json_response(request, ROLLUP_TABLES, build)
+
+@app.get("/analytics/media_messages", response_model=list[MessageRollupRead])
+async def read_media_messages(
+    request: Request,
+    channel: str = None,
+    week_from: date = None,
+    week_to: date = None,
+    db: AsyncSession = Depends(get_db),
+):
+    async def build():
+        rows = await get_message_weekly_counts(db=db, channel=channel, week_from=week_from, week_to=week_to)
+        return [MessageRollupRead.model_validate(row) for row in rows], {}
+
+    return await _cached_json_response(request, ROLLUP_TABLES, build)
+
+@app.post("/analytics/refresh", response_model=RollupRefreshResult)
+async def refresh_rollups_route(full: bool = False, db: AsyncSession = Depends(get_db)):
+    result = await refresh_rollups(db=db, full=full)
+    for table in ROLLUP_TABLES:
+        response_cache.invalidate(table)
+    return result
+
+@app.get("/search/messages", response_model=list[MessageSearchResult])
+async def search_messages_route(
+    q: str = Query(..., min_length=1),
+    channel: str = None,
+    limit: int = Query(20, ge=1, le=100),
+    prefix: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    return await search_messages(db=db, query=q, channel=channel, limit=limit, prefix=prefix)
+
+@app.get("/detections/{filename}/image")
+async def read_annotated_image(
+    request: Request,
+    filename: str,
+    size: int = Query(None, ge=16, le=4096),
+    db: AsyncSession = Depends(get_db),
+):
+    """JPEG of a scraped image with its stored detection boxes drawn, optionally shrunk to `size` pixels on its longest side."""
+    path = media_path(filename)
+    if path is None:
+        raise HTTPException(status_code=400, detail="Invalid image filename")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    key = f"{filename}?mtime={mtime}&size={size}"
+    entry = image_cache.get(key)
+    if entry is None:
+        tags = [ImageDetection.__tablename__]
+        generation = image_cache.generation(tags)
+        detections = await get_image_detections(db=db, filename=filename)
+        # Decoding, drawing and encoding are CPU-bound; keep them off the event loop
+        body = await run_in_threadpool(render_annotated_image, path, detections, size)
+        if body is None:
+            raise HTTPException(status_code=422, detail="Image could not be decoded")
+        entry = image_cache.set(key, body, {}, tags, generation)
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(entry.body, media_type="image/jpeg", headers={"ETag": entry.etag})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return metrics.render()
+
+@app.get("/cache/stats")
+async def read_cache_stats():
+    return response_cache.stats()
+
+@app.get("/cache/image_stats")
+async def read_image_cache_stats():
+    return image_cache.stats()
 
 @app.get("/")
 async def read_root():
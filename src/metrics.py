@@ -0,0 +1,205 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# Per-request SQL counters, set by MetricsMiddleware and updated by the engine hooks
+_request_sql = ContextVar("request_sql", default=None)
+
+class Histogram:
+    """Cumulative fixed-bucket histogram: one bisect and two additions per observation."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.count}')
+        suffix = "{" + labels.rstrip(",") + "}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+class RouteMetrics:
+    def __init__(self):
+        self.statuses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.sql_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_seconds = Histogram(LATENCY_BUCKETS)
+
+class MetricsRegistry:
+    """Process-wide request, SQL and connection pool metrics in Prometheus text format."""
+
+    def __init__(self):
+        self.routes = {}
+        self.sql_queries_total = 0
+        self.sql_seconds = Histogram(LATENCY_BUCKETS)
+        self.pool_wait_seconds = Histogram(LATENCY_BUCKETS)
+        self.pool_checkouts = 0
+        self.pool_checked_out = 0
+        self.pool_checked_out_peak = 0
+        self.pool_capacity = None
+
+    def observe_request(self, method, route, status, seconds, size, sql):
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics()
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.latency.observe(seconds)
+        metrics.response_size.observe(size)
+        metrics.sql_queries.observe(sql[0])
+        metrics.sql_seconds.observe(sql[1])
+
+    def observe_query(self, seconds):
+        self.sql_queries_total += 1
+        self.sql_seconds.observe(seconds)
+        sql = _request_sql.get()
+        if sql is not None:
+            sql[0] += 1
+            sql[1] += seconds
+
+    def observe_checkout(self):
+        self.pool_checkouts += 1
+        self.pool_checked_out += 1
+        if self.pool_checked_out > self.pool_checked_out_peak:
+            self.pool_checked_out_peak = self.pool_checked_out
+
+    def observe_checkin(self):
+        self.pool_checked_out -= 1
+
+    def render(self):
+        lines = ["# TYPE http_requests_total counter"]
+        for (method, route), metrics in sorted(self.routes.items()):
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+        for name, attribute in [
+            ("http_request_duration_seconds", "latency"),
+            ("http_response_size_bytes", "response_size"),
+            ("http_request_sql_queries", "sql_queries"),
+            ("http_request_sql_duration_seconds", "sql_seconds"),
+        ]:
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), metrics in sorted(self.routes.items()):
+                labels = f'method="{method}",route="{route}",'
+                lines.extend(getattr(metrics, attribute).render(name, labels))
+
+        lines.append("# TYPE db_queries_total counter")
+        lines.append(f"db_queries_total {self.sql_queries_total}")
+        lines.append("# TYPE db_query_duration_seconds histogram")
+        lines.extend(self.sql_seconds.render("db_query_duration_seconds", ""))
+        lines.append("# TYPE db_pool_checkout_wait_seconds histogram")
+        lines.extend(self.pool_wait_seconds.render("db_pool_checkout_wait_seconds", ""))
+        lines.append("# TYPE db_pool_checkouts_total counter")
+        lines.append(f"db_pool_checkouts_total {self.pool_checkouts}")
+        lines.append("# TYPE db_pool_checked_out gauge")
+        lines.append(f"db_pool_checked_out {self.pool_checked_out}")
+        lines.append("# TYPE db_pool_checked_out_peak gauge")
+        lines.append(f"db_pool_checked_out_peak {self.pool_checked_out_peak}")
+        if self.pool_capacity:
+            lines.append("# TYPE db_pool_saturation gauge")
+            lines.append(f"db_pool_saturation {self.pool_checked_out / self.pool_capacity}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.pool_wait_seconds.observe(time.perf_counter() - start)
+
+def instrument_engine(engine, pool_capacity=None):
+    """Hook query timing and pool checkout/checkin counting into an (async) engine.
+
+    `pool_capacity` (pool size plus overflow) enables the saturation gauge.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    metrics.pool_capacity = pool_capacity
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        metrics.observe_query(time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.observe_checkout()
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        metrics.observe_checkin()
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request counts, latency, response size and SQL use.
+
+    Routes are labelled by their path template (e.g. /cleaned_data/), not the raw
+    URL, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        sql = [0, 0.0]
+        token = _request_sql.set(sql)
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_sql.reset(token)
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                response["status"],
+                time.perf_counter() - start,
+                response["size"],
+                sql,
+            )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, Date, DateTime
 from database import Base
 
 class CleanedData(Base):
@@ -10,3 +10,66 @@ class CleanedData(Base):
     date_recorded = Column(Date)
 
     # Add more fields as per your requirements
+
+class Message(Base):
+    """Telegram messages collected by scripts/scraping/telegram_scraper.py."""
+    __tablename__ = "messages"
+
+    channel = Column(String(255), primary_key=True)
+    message_id = Column(BigInteger, primary_key=True)
+    date = Column(DateTime, index=True)
+    sender_id = Column(BigInteger)
+    message = Column(Text)
+    media = Column(String(3))
+
+class ImageDetection(Base):
+    """Object detections written by scripts/object_detection/yolo_detection.py."""
+    __tablename__ = "image_detection"
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String(255), index=True)
+    channel = Column(String(255), index=True)
+    message_id = Column(BigInteger)
+    class_id = Column(Integer)
+    confidence = Column(Float)
+    x_min = Column(Integer)
+    y_min = Column(Integer)
+    width = Column(Integer)
+    height = Column(Integer)
+
+class ImageDetectionChange(Base):
+    """(channel, message_id) pairs whose detections were replaced, logged by DetectionWriter for the rollups."""
+    __tablename__ = "image_detection_changes"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(255))
+    message_id = Column(BigInteger)
+
+class DetectionDailyRollup(Base):
+    """Detections per channel, message day and class, maintained by rollups.refresh_rollups."""
+    __tablename__ = "detection_daily_rollup"
+
+    channel = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True)
+    class_id = Column(Integer, primary_key=True)
+    detections = Column(Integer)
+    images = Column(Integer)
+    avg_confidence = Column(Float)
+
+class MessageWeeklyRollup(Base):
+    """Messages and messages with media per channel and ISO week (starting Monday)."""
+    __tablename__ = "message_weekly_rollup"
+
+    channel = Column(String(255), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    messages = Column(Integer)
+    media_messages = Column(Integer)
+
+class RollupWatermark(Base):
+    """Range of source row ids already folded into the rollups, per source and channel."""
+    __tablename__ = "rollup_watermarks"
+
+    source = Column(String(64), primary_key=True)
+    channel = Column(String(255), primary_key=True, default="")
+    first_id = Column(BigInteger)
+    last_id = Column(BigInteger)
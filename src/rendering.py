@@ -0,0 +1,54 @@
+import os
+import cv2
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import ImageDetection
+
+# Scraped media and the class names the detector was run with
+MEDIA_DIR = os.getenv("MEDIA_DIR", "data/raw/telegram_data")
+LABELS_PATH = os.getenv("DETECTION_LABELS_PATH", "scripts/object_detection/coco.names")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+JPEG_QUALITY = int(os.getenv("ANNOTATED_JPEG_QUALITY", "85"))
+
+def load_labels(path=LABELS_PATH):
+    """Class names by class_id, or an empty list if the labels file is missing (ids are shown instead)."""
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r") as f:
+        return [line.strip() for line in f.readlines()]
+
+LABELS = load_labels()
+
+def media_path(filename):
+    """Path of a scraped image in MEDIA_DIR, or None for names that are not a plain image filename."""
+    if os.path.basename(filename) != filename or not filename.lower().endswith(IMAGE_EXTENSIONS):
+        return None
+    return os.path.join(MEDIA_DIR, filename)
+
+async def get_image_detections(db: AsyncSession, filename: str):
+    result = await db.execute(select(ImageDetection).where(ImageDetection.filename == filename).order_by(ImageDetection.id))
+    return result.scalars().all()
+
+def render_annotated_image(path, detections, max_size=None):
+    """Draw the detection boxes on the image and encode it as JPEG bytes, or None if it cannot be read.
+
+    Boxes are drawn at full resolution, as the detection scripts did, and the
+    image is then shrunk so its longest side is at most `max_size` pixels.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    for detection in detections:
+        x, y, w, h = detection.x_min, detection.y_min, detection.width, detection.height
+        label = LABELS[detection.class_id] if 0 <= detection.class_id < len(LABELS) else str(detection.class_id)
+        cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(image, f"{label}: {detection.confidence:.2f}", (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+    if max_size is not None:
+        scale = max_size / max(image.shape[:2])
+        if scale < 1:
+            size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    encoded, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return buffer.tobytes() if encoded else None
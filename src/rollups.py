@@ -0,0 +1,240 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import Date, and_, case, delete, func, insert, inspect, literal, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import DetectionDailyRollup, ImageDetection, ImageDetectionChange, Message, MessageWeeklyRollup, RollupWatermark
+
+# Watermark sources
+MESSAGES_SOURCE = "messages"
+DETECTIONS_SOURCE = "image_detection"
+
+# Change log ids deleted per statement once their days are refreshed
+CHANGE_DELETE_BATCH = 1000
+
+def _as_date(value):
+    """func.date() returns a date on Postgres and an ISO string on SQLite."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def _day_range(day, days):
+    """Datetime bounds [day, day + days) for filtering Message.date."""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=days)
+
+def ensure_rollup_watermarks(conn):
+    """Add the first_id column to a rollup_watermarks table created before it existed.
+
+    Takes a synchronous connection, e.g. via `AsyncConnection.run_sync`.
+    """
+    columns = {column["name"] for column in inspect(conn).get_columns(RollupWatermark.__tablename__)}
+    if "first_id" not in columns:
+        conn.execute(text(f"ALTER TABLE {RollupWatermark.__tablename__} ADD COLUMN first_id BIGINT"))
+
+async def _load_watermarks(db: AsyncSession):
+    """Return {(source, channel): (first_id, last_id)}."""
+    result = await db.execute(select(RollupWatermark))
+    return {(row.source, row.channel): (row.first_id, row.last_id) for row in result.scalars()}
+
+async def _new_message_days(db: AsyncSession, full: bool):
+    """Return {(channel, day)} touched by messages outside each channel's watermark range, and their id ranges.
+
+    The scraper extends a channel's messages at both ends, with new messages
+    above the newest id and backfilled history below the oldest, so anything
+    outside [first_id, last_id] has not been folded in yet. Channels with no
+    first_id (new, or watermarked before it was tracked) are read in full.
+    """
+    day = func.date(Message.date)
+    query = select(Message.channel, day, func.min(Message.message_id), func.max(Message.message_id)).where(
+        Message.date.isnot(None)
+    )
+    if not full:
+        query = query.outerjoin(
+            RollupWatermark,
+            and_(RollupWatermark.source == MESSAGES_SOURCE, RollupWatermark.channel == Message.channel),
+        ).where(
+            or_(
+                RollupWatermark.first_id.is_(None),
+                Message.message_id < RollupWatermark.first_id,
+                Message.message_id > RollupWatermark.last_id,
+            )
+        )
+    result = await db.execute(query.group_by(Message.channel, day))
+
+    days, id_ranges = set(), {}
+    for channel, message_day, first_id, last_id in result:
+        days.add((channel, _as_date(message_day)))
+        known_first, known_last = id_ranges.get(channel, (first_id, last_id))
+        id_ranges[channel] = (min(known_first, first_id), max(known_last, last_id))
+    return days, id_ranges
+
+async def _new_detection_days(db: AsyncSession, last_id, up_to_id):
+    """Return {(channel, day)} touched by detections with last_id < id <= up_to_id."""
+    day = func.date(Message.date)
+    query = (
+        select(ImageDetection.channel, day)
+        .join(Message, and_(Message.channel == ImageDetection.channel, Message.message_id == ImageDetection.message_id))
+        .where(ImageDetection.id > last_id, ImageDetection.id <= up_to_id, Message.date.isnot(None))
+        .group_by(ImageDetection.channel, day)
+    )
+    result = await db.execute(query)
+    return {(channel, _as_date(detection_day)) for channel, detection_day in result}
+
+async def _changed_detection_days(db: AsyncSession):
+    """Return {(channel, day)} of messages in the detection change log, and the log ids read.
+
+    DetectionWriter replaces a file's detections with a delete and insert and
+    logs the file's message; a rerun that finds fewer boxes (or none) adds no
+    new ids, so only the log shows that those days changed.
+    """
+    day = func.date(Message.date)
+    query = select(ImageDetectionChange.id, ImageDetectionChange.channel, day).outerjoin(
+        Message,
+        and_(Message.channel == ImageDetectionChange.channel, Message.message_id == ImageDetectionChange.message_id),
+    )
+    result = await db.execute(query)
+
+    days, change_ids = set(), []
+    for change_id, channel, message_day in result:
+        change_ids.append(change_id)
+        if message_day is not None:
+            days.add((channel, _as_date(message_day)))
+    return days, change_ids
+
+async def _refresh_detection_partition(db: AsyncSession, channel, day):
+    await db.execute(
+        delete(DetectionDailyRollup).where(DetectionDailyRollup.channel == channel, DetectionDailyRollup.day == day)
+    )
+    start, end = _day_range(day, 1)
+    aggregate = (
+        select(
+            literal(channel),
+            literal(day, Date),
+            ImageDetection.class_id,
+            func.count(),
+            func.count(ImageDetection.filename.distinct()),
+            func.avg(ImageDetection.confidence),
+        )
+        .join(Message, and_(Message.channel == ImageDetection.channel, Message.message_id == ImageDetection.message_id))
+        .where(
+            ImageDetection.channel == channel,
+            Message.date >= start,
+            Message.date < end,
+        )
+        .group_by(ImageDetection.class_id)
+    )
+    await db.execute(
+        insert(DetectionDailyRollup).from_select(
+            ["channel", "day", "class_id", "detections", "images", "avg_confidence"], aggregate
+        )
+    )
+
+async def _refresh_message_partition(db: AsyncSession, channel, week_start):
+    await db.execute(
+        delete(MessageWeeklyRollup).where(
+            MessageWeeklyRollup.channel == channel, MessageWeeklyRollup.week_start == week_start
+        )
+    )
+    start, end = _day_range(week_start, 7)
+    aggregate = (
+        select(
+            literal(channel),
+            literal(week_start, Date),
+            func.count(),
+            func.coalesce(func.sum(case((Message.media == "Yes", 1), else_=0)), 0),
+        )
+        .where(
+            Message.channel == channel,
+            Message.date >= start,
+            Message.date < end,
+        )
+        .having(func.count() > 0)
+    )
+    await db.execute(
+        insert(MessageWeeklyRollup).from_select(["channel", "week_start", "messages", "media_messages"], aggregate)
+    )
+
+async def refresh_rollups(db: AsyncSession, full: bool = False):
+    """Bring the rollup tables up to date with the raw messages and detections.
+
+    Only the (channel, day) and (channel, week) partitions that received rows
+    since the last refresh are recomputed. New messages also refresh the detection
+    partitions of their day, since detections are dated by their message, and so
+    do messages whose detections DetectionWriter replaced or removed. A
+    channel's message watermark is an id range, so history backfilled below the
+    oldest message seen so far is picked up as well as new messages.
+    """
+    watermarks = await _load_watermarks(db)
+    detections_last_id = (watermarks.get((DETECTIONS_SOURCE, ""), (None, 0))[1] or 0) if not full else 0
+    detections_up_to_id = (await db.execute(select(func.max(ImageDetection.id)))).scalar() or 0
+
+    message_days, message_id_ranges = await _new_message_days(db, full)
+    changed_days, change_ids = await _changed_detection_days(db)
+    detection_days = message_days | changed_days | await _new_detection_days(db, detections_last_id, detections_up_to_id)
+    message_weeks = {(channel, _week_start(day)) for channel, day in message_days}
+
+    try:
+        for channel, day in sorted(detection_days):
+            await _refresh_detection_partition(db, channel, day)
+        for channel, week_start in sorted(message_weeks):
+            await _refresh_message_partition(db, channel, week_start)
+
+        for channel, (first_id, last_id) in message_id_ranges.items():
+            # Widen the range; it never shrinks, even if only one end received rows
+            known_first, known_last = watermarks.get((MESSAGES_SOURCE, channel), (None, None))
+            if known_first is not None:
+                first_id = min(first_id, known_first)
+            if known_last is not None:
+                last_id = max(last_id, known_last)
+            await db.merge(RollupWatermark(source=MESSAGES_SOURCE, channel=channel, first_id=first_id, last_id=last_id))
+        await db.merge(RollupWatermark(source=DETECTIONS_SOURCE, channel="", last_id=detections_up_to_id))
+        # Only the entries read above; a writer may log more while this runs
+        for start in range(0, len(change_ids), CHANGE_DELETE_BATCH):
+            batch = change_ids[start:start + CHANGE_DELETE_BATCH]
+            await db.execute(delete(ImageDetectionChange).where(ImageDetectionChange.id.in_(batch)))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return {
+        "detection_partitions": len(detection_days),
+        "message_partitions": len(message_weeks),
+    }
+
+async def get_top_detected_classes(db: AsyncSession, channel=None, day_from=None, day_to=None, top=5):
+    """Top `top` classes by detections for each (channel, day), newest day first."""
+    query = select(DetectionDailyRollup)
+    if channel is not None:
+        query = query.where(DetectionDailyRollup.channel == channel)
+    if day_from is not None:
+        query = query.where(DetectionDailyRollup.day >= day_from)
+    if day_to is not None:
+        query = query.where(DetectionDailyRollup.day <= day_to)
+    query = query.order_by(
+        DetectionDailyRollup.day.desc(),
+        DetectionDailyRollup.channel,
+        DetectionDailyRollup.detections.desc(),
+        DetectionDailyRollup.class_id,
+    )
+    result = await db.execute(query)
+
+    rows, ranks = [], {}
+    for row in result.scalars():
+        partition = (row.channel, row.day)
+        ranks[partition] = ranks.get(partition, 0) + 1
+        if ranks[partition] <= top:
+            rows.append(row)
+    return rows
+
+async def get_message_weekly_counts(db: AsyncSession, channel=None, week_from=None, week_to=None):
+    query = select(MessageWeeklyRollup)
+    if channel is not None:
+        query = query.where(MessageWeeklyRollup.channel == channel)
+    if week_from is not None:
+        query = query.where(MessageWeeklyRollup.week_start >= _week_start(week_from))
+    if week_to is not None:
+        query = query.where(MessageWeeklyRollup.week_start <= week_to)
+    query = query.order_by(MessageWeeklyRollup.week_start.desc(), MessageWeeklyRollup.channel)
+    result = await db.execute(query)
+    return result.scalars().all()
@@ -1,17 +1,57 @@
-from pydantic import BaseModel
+from datetime import date, datetime
+from typing import Optional
+from pydantic import BaseModel, ConfigDict
 
 class CleanedDataCreate(BaseModel):
-    field1: str
-    field2: str
-    field3: int
-    field4: bool
+    name: str
+    age: int
+    date_recorded: Optional[date] = None
+
+    model_config = ConfigDict(extra="forbid")  # Unknown keys are errors rather than silently dropped
 
 class CleanedDataRead(BaseModel):
     id: int
-    field1: str
-    field2: str
-    field3: int
-    field4: bool
+    name: Optional[str]
+    age: Optional[int]
+    date_recorded: Optional[date]
+
+    model_config = ConfigDict(from_attributes=True)  # Build from SQLAlchemy rows
+
+class BulkRowError(BaseModel):
+    index: int
+    error: str
+
+class BulkInsertResult(BaseModel):
+    inserted_ids: list[int]
+    errors: list[BulkRowError]
+    elapsed_seconds: float
+    rows_per_second: float
+
+class DetectionRollupRead(BaseModel):
+    channel: str
+    day: date
+    class_id: int
+    detections: int
+    images: int
+    avg_confidence: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+class MessageRollupRead(BaseModel):
+    channel: str
+    week_start: date
+    messages: int
+    media_messages: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RollupRefreshResult(BaseModel):
+    detection_partitions: int
+    message_partitions: int
 
-    class Config:
-        orm_mode = True  # Enable ORM mode for SQLAlchemy compatibility
+class MessageSearchResult(BaseModel):
+    channel: str
+    message_id: int
+    date: Optional[datetime]
+    message: Optional[str]
+    rank: float
@@ -0,0 +1,120 @@
+import re
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Words are runs of Unicode letters/digits, which covers both Latin and Ethiopic
+# script; Ethiopic punctuation (፡ ። ፣ ...) separates words like whitespace does.
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Amharic homophone syllable families that are spelled interchangeably
+# (ሐ/ኀ -> ሀ, ሠ -> ሰ, ዐ -> አ, ፀ -> ጸ). Each family spans seven vowel orders.
+_HOMOPHONE_FAMILIES = {0x1210: 0x1200, 0x1280: 0x1200, 0x1220: 0x1230, 0x12D0: 0x12A0, 0x1340: 0x1338}
+HOMOPHONE_FROM = "".join(chr(base + order) for base in _HOMOPHONE_FAMILIES for order in range(7))
+HOMOPHONE_TO = "".join(chr(target + order) for target in _HOMOPHONE_FAMILIES.values() for order in range(7))
+_HOMOPHONE_TABLE = str.maketrans(HOMOPHONE_FROM, HOMOPHONE_TO)
+
+def normalize_text(value):
+    """Lowercase Latin text and fold Amharic homophone syllables to one spelling."""
+    return value.lower().translate(_HOMOPHONE_TABLE)
+
+def tokenize(query):
+    return TOKEN_PATTERN.findall(normalize_text(query))
+
+# Postgres: a generated tsvector column with a GIN index is kept up to date by
+# the database on every insert/update. 'simple' avoids English stemming, which
+# would mangle Amharic and drug names.
+POSTGRES_INDEX_DDL = [
+    f"""
+    ALTER TABLE messages ADD COLUMN IF NOT EXISTS message_tsv tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', translate(lower(coalesce(message, '')), '{HOMOPHONE_FROM}', '{HOMOPHONE_TO}'))
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_message_tsv ON messages USING GIN (message_tsv)",
+]
+
+def install_sqlite_functions(engine):
+    """Register normalize_text as the SQL function fold_text on every new SQLite connection."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "fold_text", 1, lambda value: normalize_text(value or ""), deterministic=True
+        )
+
+# SQLite (local stand-in): a contentless FTS5 table fed the folded text by triggers.
+# Needs fold_text, see install_sqlite_functions.
+SQLITE_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        message, content='', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, message) VALUES (new.rowid, fold_text(new.message));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.rowid, fold_text(old.message));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.rowid, fold_text(old.message));
+        INSERT INTO messages_fts(rowid, message) VALUES (new.rowid, fold_text(new.message));
+    END
+    """,
+]
+
+def ensure_search_index(conn):
+    """Create the full-text index over messages.message if it does not exist yet.
+
+    Takes a synchronous connection, e.g. via `AsyncConnection.run_sync`.
+    """
+    if conn.dialect.name == "postgresql":
+        for statement in POSTGRES_INDEX_DDL:
+            conn.execute(text(statement))
+    elif conn.dialect.name == "sqlite":
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        ).first()
+        for statement in SQLITE_INDEX_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            # Index the messages that were stored before the FTS table existed
+            conn.execute(text("INSERT INTO messages_fts(rowid, message) SELECT rowid, fold_text(message) FROM messages"))
+
+async def search_messages(db: AsyncSession, query: str, channel: str = None, limit: int = 20, prefix: bool = True):
+    """Return messages matching every word of `query`, best match first."""
+    terms = tokenize(query)
+    if not terms:
+        return []
+    params = {"limit": limit, "channel": channel}
+
+    if db.bind.dialect.name == "postgresql":
+        suffix = ":*" if prefix else ""
+        params["query"] = " & ".join(term + suffix for term in terms)
+        statement = """
+            SELECT m.channel, m.message_id, m.date, m.message, ts_rank(m.message_tsv, q) AS rank
+            FROM messages m, to_tsquery('simple', :query) q
+            WHERE m.message_tsv @@ q AND (CAST(:channel AS VARCHAR) IS NULL OR m.channel = :channel)
+            ORDER BY rank DESC
+            LIMIT :limit
+        """
+    else:
+        suffix = "*" if prefix else ""
+        params["query"] = " ".join(f'"{term}"{suffix}' for term in terms)
+        statement = """
+            SELECT m.channel, m.message_id, m.date, m.message, -messages_fts.rank AS rank
+            FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid
+            WHERE messages_fts MATCH :query AND (:channel IS NULL OR m.channel = :channel)
+            ORDER BY messages_fts.rank
+            LIMIT :limit
+        """
+    result = await db.execute(text(statement), params)
+    return result.mappings().all()
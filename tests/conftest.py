@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The API and scripts use flat imports from their own directories
+for path in ("src", "scripts/scraping", "scripts/cleaning"):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+# The API creates its engine at import time; run it on a throwaway SQLite database
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db"
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from rate_limiter import FloodWaitError
+
+def flood_wait(seconds):
+    """A FloodWaitError, from telethon when it is installed or the scraper's stand-in otherwise."""
+    try:
+        return FloodWaitError(request=None, capture=seconds)
+    except TypeError:
+        return FloodWaitError(seconds=seconds)
+
+class FakeClient:
+    """In-memory stand-in for the Telethon client calls the scraper makes.
+
+    iter_messages follows Telegram's paging: newest first, or oldest first with
+    `reverse`; `min_id` and `offset_id` are exclusive bounds. Each request
+    sleeps `delay` seconds, and the next `flood_waits` requests raise a
+    FloodWait of that many seconds instead.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = {}
+        self.flood_waits = []
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.downloads = 0
+        self.failing_media = set()
+
+    def post(self, channel, count, media=None):
+        """Add `count` messages to the channel; `media(message_id)` gives each one's media, if any."""
+        messages = self.messages.setdefault(channel, [])
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for message_id in range(len(messages) + 1, len(messages) + count + 1):
+            messages.append(SimpleNamespace(
+                id=message_id, date=start + timedelta(hours=message_id), sender_id=1,
+                message=f"{channel} {message_id}", media=media(message_id) if media else None,
+            ))
+
+    async def iter_messages(self, channel, limit=100, offset_id=0, min_id=0, reverse=False):
+        self.requests += 1
+        if self.flood_waits:
+            raise flood_wait(self.flood_waits.pop(0))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        messages = [message for message in self.messages[channel] if message.id > min_id]
+        if offset_id:
+            messages = [message for message in messages if message.id < offset_id]
+        if not reverse:
+            messages = messages[::-1]
+        for message in messages[:limit]:
+            yield message
+
+    async def download_media(self, media, file=None):
+        self.downloads += 1
+        await asyncio.sleep(self.delay)
+        if media in self.failing_media:
+            raise ConnectionError(f"download of {media} failed")
+        return media.encode() * 100
@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+import main
+from database import SessionLocal
+from models import CleanedData
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def client():
+    await main.create_tables()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+    async with SessionLocal() as db:
+        await db.execute(delete(CleanedData))
+        await db.commit()
+    main.response_cache.invalidate(CleanedData.__tablename__)
+
+async def test_create_returns_the_stored_row(client):
+    response = await client.post("/cleaned_data/", json={"name": "Abebe", "age": 34, "date_recorded": "2024-10-01"})
+    assert response.status_code == 200
+    row = response.json()
+    assert row["id"] > 0
+    assert row == {"id": row["id"], "name": "Abebe", "age": 34, "date_recorded": "2024-10-01"}
+
+async def test_create_rejects_unknown_fields(client):
+    response = await client.post("/cleaned_data/", json={"name": "Abebe", "age": 34, "field1": "x"})
+    assert response.status_code == 422
+
+async def test_bulk_inserts_valid_rows_and_reports_invalid_ones(client):
+    records = [{"name": "a", "age": 1}, {"field1": "x", "field2": "y"}, {"name": "c", "age": 3, "date_recorded": "2024-01-02"}]
+    response = await client.post("/cleaned_data/bulk", json=records)
+    assert response.status_code == 200
+    result = response.json()
+    assert len(result["inserted_ids"]) == 2
+    assert [error["index"] for error in result["errors"]] == [1]
+
+    page = (await client.get("/cleaned_data/")).json()
+    assert [(row["id"], row["name"], row["age"]) for row in page] == list(zip(result["inserted_ids"], ["a", "c"], [1, 3]))
+
+async def test_bulk_accepts_ndjson(client):
+    body = "\n".join(json.dumps({"name": f"n{i}", "age": i}) for i in range(3))
+    response = await client.post("/cleaned_data/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert len(response.json()["inserted_ids"]) == 3
+
+async def test_bulk_rejects_a_body_that_is_not_a_list(client):
+    response = await client.post("/cleaned_data/bulk", json={"name": "a", "age": 1})
+    assert response.status_code == 400
+
+async def test_pages_follow_the_next_cursor(client):
+    records = [{"name": f"n{i}", "age": 20 + i} for i in range(5)]
+    ids = (await client.post("/cleaned_data/bulk", json=records)).json()["inserted_ids"]
+
+    seen, after_id = [], None
+    while True:
+        params = {"limit": 2} if after_id is None else {"limit": 2, "after_id": after_id}
+        response = await client.get("/cleaned_data/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(row["id"] for row in page)
+        after_id = response.headers.get("x-next-cursor")
+        if after_id is None:
+            break
+        assert after_id == str(page[-1]["id"])
+    assert seen == ids
+
+async def test_page_filters_and_descending_order(client):
+    await client.post("/cleaned_data/bulk", json=[{"name": f"n{i}", "age": 20 + i} for i in range(5)])
+    response = await client.get("/cleaned_data/", params={"min_age": 21, "max_age": 23, "order": "desc"})
+    assert [row["age"] for row in response.json()] == [23, 22, 21]
+
+async def test_page_is_refreshed_after_a_write(client):
+    assert (await client.get("/cleaned_data/")).json() == []
+    await client.post("/cleaned_data/", json={"name": "a", "age": 1})
+    assert len((await client.get("/cleaned_data/")).json()) == 1
+
+async def test_cache_keys_do_not_collide_on_encoded_parameters(client):
+    await client.post("/cleaned_data/bulk", json=[{"name": "a", "age": 10}, {"name": "a&order=desc", "age": 1}])
+    response = await client.get("/cleaned_data/", params={"name": "a", "order": "desc"})
+    assert [row["age"] for row in response.json()] == [10]
+    response = await client.get("/cleaned_data/", params={"name": "a&order=desc"})
+    assert [row["age"] for row in response.json()] == [1]
+
+async def test_export_streams_ndjson_and_csv(client):
+    records = [{"name": f"n{i}", "age": i, "date_recorded": "2024-01-01"} for i in range(3)]
+    ids = (await client.post("/cleaned_data/bulk", json=records)).json()["inserted_ids"]
+
+    response = await client.get("/cleaned_data/export")
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == ids
+    assert rows[0] == {"id": ids[0], "name": "n0", "age": 0, "date_recorded": "2024-01-01"}
+
+    response = await client.get("/cleaned_data/export", params={"format": "csv", "order": "desc"})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == ids[::-1]
+    assert list(rows[0]) == ["id", "name", "age", "date_recorded"]
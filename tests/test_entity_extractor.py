@@ -0,0 +1,28 @@
+import pandas as pd
+
+from entity_extractor import SAMPLE_MESSAGES, extract_entities, extract_entities_naive
+
+COLUMNS = ["message_normalized", "price_etb", "phone_numbers", "dosage_value", "dosage_unit", "drug_names"]
+
+def entities(df):
+    return df[COLUMNS].astype(object).where(df[COLUMNS].notna(), None).to_dict("records")
+
+def test_vectorized_extraction_matches_the_per_row_reference():
+    df = pd.DataFrame({"message": SAMPLE_MESSAGES})
+
+    assert entities(extract_entities(df)) == entities(extract_entities_naive(df))
+
+def test_numbers_attached_to_ethiopic_words_are_extracted():
+    df = pd.DataFrame({"message": ["ዋጋ 120ብር ስልክ0911234567", "ፓራሲታሞል500mg"]})
+
+    for extract in (extract_entities, extract_entities_naive):
+        rows = entities(extract(df))
+
+        assert (rows[0]["price_etb"], rows[0]["phone_numbers"]) == (120.0, "+251911234567")
+        assert (rows[1]["dosage_value"], rows[1]["dosage_unit"], rows[1]["drug_names"]) == (500.0, "mg", "paracetamol")
+
+def test_thousands_grouped_prices_keep_their_fraction():
+    df = pd.DataFrame({"message": ["price 1,250.50 birr", "2,400.75 ETB", "1,200 birr"]})
+
+    for extract in (extract_entities, extract_entities_naive):
+        assert [row["price_etb"] for row in entities(extract(df))] == [1250.5, 2400.75, 1200.0]
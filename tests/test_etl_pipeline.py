@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def etl_pipeline(tmp_path, monkeypatch):
+    # The module configures a log file in the working directory when imported
+    monkeypatch.chdir(tmp_path)
+    import etl_pipeline
+
+    return etl_pipeline
+
+def messages(rows):
+    return pd.DataFrame(
+        [(channel, message_id, f"2024-01-{message_id % 28 + 1:02d}") for channel, message_id in rows],
+        columns=["channel", "message_id", "date"],
+    )
+
+WATERMARKS = {"a": (5, 12, None), "b": (None, 22, None)}
+ROWS = [("a", i) for i in range(1, 16)] + [("b", 20), ("b", 21)] + [("c", 1)]
+# Below and above a's loaded range, all of b (range start unknown) and the unseen channel c
+EXPECTED = [("a", 1), ("a", 2), ("a", 3), ("a", 4), ("a", 13), ("a", 14), ("a", 15), ("b", 20), ("b", 21), ("c", 1)]
+
+def loaded(df):
+    return sorted(zip(df["channel"], df["message_id"].astype(int)))
+
+def test_csv_rows_outside_the_loaded_range_are_new(etl_pipeline, tmp_path):
+    path = tmp_path / "raw.csv"
+    messages(ROWS).to_csv(path, index=False)
+
+    assert loaded(etl_pipeline.load_new_data(str(path), WATERMARKS, chunksize=4)) == EXPECTED
+
+def test_parquet_rows_outside_the_loaded_range_are_new(etl_pipeline, tmp_path):
+    path = tmp_path / "staging"
+    etl_pipeline.save_parquet_partitions(messages(ROWS), str(path))
+
+    assert loaded(etl_pipeline.load_new_data(str(path), WATERMARKS)) == EXPECTED
+
+def test_csv_reads_resume_after_the_saved_offset(etl_pipeline, tmp_path):
+    path = tmp_path / "raw.csv"
+    messages([("a", 1), ("a", 2)]).to_csv(path, index=False)
+    start, end, fingerprint = etl_pipeline.csv_byte_range(str(path))
+    assert loaded(etl_pipeline.load_new_data(str(path), {}, byte_range=(start, end))) == [("a", 1), ("a", 2)]
+
+    # The scraper appends more rows, and is still writing the last one
+    messages([("b", 3), ("a", 4)]).to_csv(path, mode="a", header=False, index=False)
+    with open(path, "a") as f:
+        f.write("a,5,2024-01-")
+    start, end, fingerprint = etl_pipeline.csv_byte_range(str(path), (end, fingerprint))
+    assert loaded(etl_pipeline.load_new_data(str(path), {}, byte_range=(start, end))) == [("a", 4), ("b", 3)]
+
+def test_a_rotated_csv_is_read_from_the_start(etl_pipeline, tmp_path):
+    path = tmp_path / "raw.csv"
+    messages([("a", 1), ("a", 2)]).to_csv(path, index=False)
+    _, end, fingerprint = etl_pipeline.csv_byte_range(str(path))
+
+    messages([("c", 7), ("c", 8), ("c", 9)]).to_csv(path, index=False)
+    start, end, _ = etl_pipeline.csv_byte_range(str(path), (end, fingerprint))
+    assert start == 0
+    assert loaded(etl_pipeline.load_new_data(str(path), {}, byte_range=(start, end))) == [("c", 7), ("c", 8), ("c", 9)]
+
+def test_source_offsets_are_saved_per_path(etl_pipeline, tmp_path):
+    engine = etl_pipeline.create_engine(f"sqlite:///{tmp_path / 'etl.db'}")
+    assert etl_pipeline.load_source_offset(engine, "raw.csv") is None
+
+    with engine.begin() as conn:
+        etl_pipeline.save_source_offset(conn, "raw.csv", 10, "x")
+        etl_pipeline.save_source_offset(conn, "raw.csv", 25, "y")
+    assert etl_pipeline.load_source_offset(engine, "raw.csv") == (25, "y")
+
+def test_published_partitions_join_the_staging_dataset(etl_pipeline, tmp_path):
+    staging, pending = tmp_path / "staging", tmp_path / "staging.pending"
+    etl_pipeline.save_parquet_partitions(messages([("a", 1), ("b", 2)]), str(staging))
+    etl_pipeline.save_parquet_partitions(messages([("a", 3)]), str(pending))
+
+    etl_pipeline.publish_parquet_partitions(str(pending), str(staging))
+    assert loaded(etl_pipeline.load_data(str(staging))) == [("a", 1), ("a", 3), ("b", 2)]
+    assert not pending.exists()
+
+    etl_pipeline.save_parquet_partitions(messages([("c", 4)]), str(pending))
+    etl_pipeline.publish_parquet_partitions(str(pending), str(staging), replace=True)
+    assert loaded(etl_pipeline.load_data(str(staging))) == [("c", 4)]
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+
+import pytest
+
+import telegram_scraper
+from fake_telegram import FakeClient
+from media_downloader import MediaDownloader
+from rate_limiter import TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+def every_other_image(message_id):
+    # Odd messages carry one of three images, so the same content is posted many times
+    return f"image-{message_id % 3}" if message_id % 2 else None
+
+async def scrape_with_downloader(client, media_dir, workers=4):
+    limiter = TokenBucket(rate=1000, capacity=1000)
+    downloader = MediaDownloader(client, limiter, str(media_dir), workers=workers, queue_size=5)
+    await downloader.start()
+    try:
+        await telegram_scraper.scrape_channels(client, ["a", "b"], limiter, limit=30, downloader=downloader)
+    finally:
+        stats = await downloader.close()
+    return stats
+
+def manifest(media_dir):
+    with sqlite3.connect(os.path.join(media_dir, "media_manifest.sqlite")) as connection:
+        return connection.execute("SELECT channel, message_id, sha256 FROM media ORDER BY channel, message_id").fetchall()
+
+async def test_reposted_images_are_stored_once(tmp_path):
+    client = FakeClient(delay=0.01)
+    for channel in "ab":
+        client.post(channel, 30, media=every_other_image)
+
+    stats = await scrape_with_downloader(client, tmp_path)
+
+    assert stats["downloaded_files"] == 30
+    assert stats["new_blobs"] == 3
+    assert stats["failed"] == 0
+    assert stats["max_queue_depth"] <= 5
+    blobs = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(blobs) == 3
+
+    rows = manifest(tmp_path)
+    assert [(channel, message_id) for channel, message_id, _ in rows] == [
+        (channel, message_id) for channel in "ab" for message_id in range(1, 31, 2)
+    ]
+    # Names by message are hard links to the blobs
+    for channel, message_id, sha256 in rows:
+        name_path = tmp_path / f"{channel}_{message_id}.jpg"
+        assert os.path.samefile(name_path, os.path.join(tmp_path, "blobs", sha256[:2], f"{sha256}.jpg"))
+
+async def test_stored_media_is_not_downloaded_again(tmp_path):
+    client = FakeClient()
+    for channel in "ab":
+        client.post(channel, 30, media=every_other_image)
+    await scrape_with_downloader(client, tmp_path)
+    downloads = client.downloads
+
+    # Without a scrape state the same messages come back, but their media is already stored
+    stats = await scrape_with_downloader(client, tmp_path)
+
+    assert client.downloads == downloads
+    assert stats["skipped"] == 30
+    assert stats["downloaded_files"] == 0
+
+async def test_failed_downloads_are_counted_and_retried_later(tmp_path):
+    client = FakeClient()
+    client.post("a", 30, media=every_other_image)
+    client.post("b", 30, media=every_other_image)
+    client.failing_media = {"image-0"}
+
+    stats = await scrape_with_downloader(client, tmp_path)
+    assert stats["failed"] == 10
+    assert len(manifest(tmp_path)) == 20
+
+    client.failing_media = set()
+    stats = await scrape_with_downloader(client, tmp_path)
+    assert stats["downloaded_files"] == 10
+    assert len(manifest(tmp_path)) == 30
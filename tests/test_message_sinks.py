@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import telegram_scraper
+from fake_telegram import FakeClient
+from message_sinks import MESSAGE_COLUMNS, MemorySink, ParquetSink, append_csv
+from rate_limiter import TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+def records(channel, first_id, count):
+    return [
+        {"channel": channel, "message_id": message_id, "date": pd.Timestamp("2024-01-01", tz="UTC"),
+         "sender_id": 1, "message": "m", "media": "No"}
+        for message_id in range(first_id, first_id + count)
+    ]
+
+class FlakySink(MemorySink):
+    """MemorySink whose first `failures` batch writes raise."""
+
+    def __init__(self, failures, **options):
+        super().__init__(**options)
+        self.failures = failures
+
+    def _write_batch(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database down")
+        super()._write_batch(rows)
+
+async def test_batches_are_written_by_size_and_on_close():
+    sink = MemorySink(batch_size=100, flush_interval=60)
+    await sink.open()
+    for page in range(5):
+        await sink.write("a", records("a", page * 50 + 1, 50))
+    assert (sink.batches, len(sink.rows)) == (2, 200)
+
+    await sink.close()
+    assert (sink.batches, sink.written) == (3, 250)
+    assert [row["message_id"] for row in sink.rows] == list(range(1, 251))
+
+async def test_batches_are_written_on_a_timer():
+    sink = MemorySink(batch_size=1000, flush_interval=0.05)
+    await sink.open()
+    await sink.write("a", records("a", 1, 10))
+    await asyncio.sleep(0.2)
+    assert len(sink.rows) == 10
+    await sink.close()
+
+async def test_checkpoint_is_saved_only_after_its_batch_is_written(tmp_path):
+    state = telegram_scraper.ScrapeState(str(tmp_path / "state.json"), autosave=False)
+    sink = FlakySink(failures=1, batch_size=1000, flush_interval=60, checkpoint=state, csv_path=str(tmp_path / "out.csv"))
+    await sink.open()
+    await sink.write("a", records("a", 1, 10))
+    state.get("a").update(last_id=10, oldest_id=1)
+
+    with pytest.raises(ConnectionError):
+        await sink.flush()
+    assert not (tmp_path / "state.json").exists()
+    assert not (tmp_path / "out.csv").exists()
+
+    await sink.close()
+    assert len(sink.rows) == 10
+    assert json.loads((tmp_path / "state.json").read_text())["a"]["last_id"] == 10
+    assert len(pd.read_csv(tmp_path / "out.csv")) == 10
+
+async def scrape_into(client, sink, state, cancel_after=None):
+    await sink.open()
+    try:
+        task = asyncio.create_task(telegram_scraper.scrape_channels(
+            client, list("abc"), TokenBucket(rate=1000, capacity=1000), limit=1000, state=state, on_page=sink.write,
+        ))
+        if cancel_after is not None:
+            await asyncio.sleep(cancel_after)
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        await sink.close()
+
+async def test_an_interrupted_run_keeps_the_csv_in_step_with_the_checkpoint(tmp_path):
+    client = FakeClient(delay=0.05)
+    for channel in "abc":
+        client.post(channel, 1000)
+    state_path, csv_path = str(tmp_path / "state.json"), str(tmp_path / "out.csv")
+
+    def sink(state):
+        return MemorySink(batch_size=250, flush_interval=0.1, checkpoint=state, csv_path=csv_path)
+
+    state = telegram_scraper.ScrapeState(state_path, autosave=False)
+    await scrape_into(client, sink(state), state, cancel_after=0.3)
+
+    saved = json.loads((tmp_path / "state.json").read_text())
+    df = pd.read_csv(csv_path)
+    assert 0 < len(df) < 3000
+    for channel, progress in saved.items():
+        ids = sorted(df.loc[df["channel"] == channel, "message_id"])
+        assert ids == list(range(progress["oldest_id"], progress["last_id"] + 1))
+
+    state = telegram_scraper.ScrapeState(state_path, autosave=False)
+    await scrape_into(client, sink(state), state)
+    df = pd.read_csv(csv_path)
+    assert len(df) == 3000
+    assert not df.duplicated(["channel", "message_id"]).any()
+
+async def test_parquet_sink_writes_a_channel_and_day_partitioned_dataset(tmp_path):
+    sink = ParquetSink(str(tmp_path / "messages"), batch_size=30, flush_interval=60)
+    await sink.open()
+    await sink.write("a", records("a", 1, 40))
+    await sink.write("b", records("b", 1, 5))
+    await sink.close()
+
+    assert sorted(path.name for path in (tmp_path / "messages").iterdir()) == ["channel=a", "channel=b"]
+    df = pq.read_table(str(tmp_path / "messages"), partitioning="hive").to_pandas()
+    assert df.groupby("channel", observed=True)["message_id"].count().to_dict() == {"a": 40, "b": 5}
+
+def test_a_csv_with_other_columns_is_moved_aside(tmp_path):
+    path = tmp_path / "telegram_scraped_data.csv"
+    path.write_text("message_id,date,sender_id,message,media\n1,2024-01-01,1,old,No\n")
+
+    append_csv(str(path), records("a", 2, 2))
+
+    assert list(pd.read_csv(path).columns) == MESSAGE_COLUMNS
+    assert list(pd.read_csv(path)["message_id"]) == [2, 3]
+    (legacy,) = tmp_path.glob("telegram_scraped_data.legacy-*.csv")
+    assert list(pd.read_csv(legacy)["message"]) == ["old"]
+
+def test_an_empty_csv_gets_a_header(tmp_path):
+    path = tmp_path / "telegram_scraped_data.csv"
+    path.touch()
+
+    append_csv(str(path), records("a", 1, 1))
+    append_csv(str(path), records("a", 2, 1))
+
+    assert list(pd.read_csv(path)["message_id"]) == [1, 2]
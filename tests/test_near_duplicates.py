@@ -0,0 +1,39 @@
+import pandas as pd
+
+from near_duplicates import NearDuplicateIndex
+
+def test_messages_are_keyed_by_channel_and_id():
+    index = NearDuplicateIndex()
+    df = pd.DataFrame({
+        "channel": ["a", "b", "b"],
+        "id": [1, 1, 2],
+        "message": [
+            "Paracetamol 500mg tablets available now",
+            "Amoxicillin 250mg capsules in stock today",
+            "paracetamol 500mg tablets available NOW!",
+        ],
+    })
+
+    canonical = index.assign(df)
+
+    assert list(zip(canonical["canonical_channel"], canonical["canonical_id"])) == [("a", 1), ("b", 1), ("a", 1)]
+
+def test_empty_and_short_texts_are_their_own_canonical_message():
+    index = NearDuplicateIndex()
+    df = pd.DataFrame({"channel": ["a"] * 4, "id": [1, 2, 3, 4], "message": ["", None, "ok", "ok"]})
+
+    canonical = index.assign(df)
+
+    assert list(canonical["canonical_id"]) == [1, 2, 3, 4]
+    assert not index.signatures
+
+def test_an_index_from_an_older_version_is_replaced(tmp_path):
+    path = str(tmp_path / "index.pkl")
+    old = NearDuplicateIndex()
+    old.add(("a", 1), "some message text here")
+    del old.version
+    old.save(path)
+
+    index = NearDuplicateIndex.load(path)
+
+    assert not index.signatures
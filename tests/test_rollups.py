@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy import delete, select
+
+import main
+from database import SessionLocal
+from models import DetectionDailyRollup, ImageDetection, ImageDetectionChange, Message, MessageWeeklyRollup, RollupWatermark
+from rollups import MESSAGES_SOURCE, refresh_rollups
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def db():
+    await main.create_tables()
+    async with SessionLocal() as db:
+        yield db
+        for model in (Message, ImageDetection, ImageDetectionChange, MessageWeeklyRollup, DetectionDailyRollup, RollupWatermark):
+            await db.execute(delete(model))
+        await db.commit()
+
+@pytest.fixture
+async def client(db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+    for table in main.ROLLUP_TABLES:
+        main.response_cache.invalidate(table)
+
+def message(message_id, day, media="No"):
+    return Message(channel="a", message_id=message_id, date=datetime(2024, 3, day), message="m", media=media)
+
+async def weekly_counts(db):
+    result = await db.execute(select(MessageWeeklyRollup).order_by(MessageWeeklyRollup.week_start))
+    return [(row.week_start.isoformat(), row.messages, row.media_messages) for row in result.scalars()]
+
+async def test_backfilled_messages_reach_the_rollups(db):
+    db.add_all([message(100, 11), message(101, 12), message(102, 18)])
+    await db.commit()
+    assert await refresh_rollups(db) == {"detection_partitions": 3, "message_partitions": 2}
+    assert await refresh_rollups(db) == {"detection_partitions": 0, "message_partitions": 0}
+
+    # History older than anything seen so far, as the scraper's backfill adds it
+    db.add_all([message(50, 4, media="Yes"), message(103, 19)])
+    await db.commit()
+    assert await refresh_rollups(db) == {"detection_partitions": 2, "message_partitions": 2}
+
+    assert await weekly_counts(db) == [("2024-03-04", 1, 1), ("2024-03-11", 2, 0), ("2024-03-18", 2, 0)]
+    watermark = await db.get(RollupWatermark, (MESSAGES_SOURCE, "a"))
+    assert (watermark.first_id, watermark.last_id) == (50, 103)
+
+def detection(message_id, class_id, confidence, filename="a.jpg"):
+    return ImageDetection(filename=filename, channel="a", message_id=message_id, class_id=class_id, confidence=confidence)
+
+async def test_replaced_detections_refresh_their_day(db):
+    db.add_all([message(100, 11), detection(100, 0, 0.9), detection(100, 39, 0.5)])
+    await db.commit()
+    await refresh_rollups(db)
+
+    # A rerun that finds nothing in the image, as DetectionWriter records it
+    await db.execute(delete(ImageDetection).where(ImageDetection.filename == "a.jpg"))
+    db.add(ImageDetectionChange(channel="a", message_id=100))
+    await db.commit()
+    assert await refresh_rollups(db) == {"detection_partitions": 1, "message_partitions": 0}
+
+    assert (await db.execute(select(DetectionDailyRollup))).scalars().all() == []
+    assert (await db.execute(select(ImageDetectionChange))).scalars().all() == []
+    assert await refresh_rollups(db) == {"detection_partitions": 0, "message_partitions": 0}
+
+async def test_refresh_route_serves_the_analytics_endpoints(db, client):
+    db.add_all([message(100, 11, media="Yes"), message(101, 11), message(102, 18, media="Yes")])
+    db.add_all([detection(100, 0, 0.9), detection(100, 0, 0.7), detection(100, 39, 0.5)])
+    await db.commit()
+    assert (await client.get("/analytics/media_messages")).json() == []
+
+    response = await client.post("/analytics/refresh")
+    assert response.status_code == 200
+    assert response.json() == {"detection_partitions": 2, "message_partitions": 2}
+
+    response = await client.get("/analytics/media_messages", params={"channel": "a"})
+    assert response.status_code == 200
+    assert response.json() == [
+        {"channel": "a", "week_start": "2024-03-18", "messages": 1, "media_messages": 1},
+        {"channel": "a", "week_start": "2024-03-11", "messages": 2, "media_messages": 1},
+    ]
+
+    response = await client.get("/analytics/top_classes", params={"top": 1})
+    assert response.status_code == 200
+    assert response.json() == [
+        {"channel": "a", "day": "2024-03-11", "class_id": 0, "detections": 2, "images": 1, "avg_confidence": pytest.approx(0.8)},
+    ]
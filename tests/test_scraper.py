@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+import telegram_scraper
+from fake_telegram import FakeClient
+from rate_limiter import TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+def unlimited():
+    return TokenBucket(rate=1000, capacity=1000)
+
+async def test_channels_are_scraped_concurrently_up_to_the_limit():
+    client = FakeClient(delay=0.02)
+    for channel in "abcd":
+        client.post(channel, 150)
+
+    df = await telegram_scraper.scrape_channels(client, list("abcd"), unlimited(), concurrency=2, limit=150)
+
+    assert len(df) == 600
+    assert df.groupby("channel")["message_id"].nunique().to_dict() == {channel: 150 for channel in "abcd"}
+    assert client.max_active == 2
+
+async def test_flood_wait_pauses_requests_and_retries():
+    client = FakeClient()
+    client.post("a", 50)
+    client.flood_waits = [1]
+
+    start = time.monotonic()
+    df = await telegram_scraper.scrape_channels(client, ["a"], unlimited(), limit=50)
+
+    assert len(df) == 50
+    assert time.monotonic() - start >= 1
+
+async def test_failing_and_invalid_channels_do_not_stop_the_others():
+    client = FakeClient()
+    client.post("a", 10)
+
+    df = await telegram_scraper.scrape_channels(client, ["a", "missing", None, ""], unlimited(), limit=10)
+
+    assert sorted(df["message_id"]) == list(range(1, 11))
+    assert set(df["channel"]) == {"a"}
+
+async def test_token_bucket_spaces_requests_after_a_burst():
+    limiter = TokenBucket(rate=20, capacity=2)
+
+    start = time.monotonic()
+    for _ in range(6):
+        await limiter.acquire()
+
+    # Two tokens are available at once, the other four arrive at 20 per second
+    assert time.monotonic() - start >= 0.18
+
+class Store:
+    """on_page callback that fails if a message is stored twice, optionally failing after `fail_after` pages."""
+
+    def __init__(self, fail_after=None):
+        self.messages = {}
+        self.fail_after = fail_after
+
+    def __call__(self, channel, records):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise ConnectionError("database down")
+            self.fail_after -= 1
+        for record in records:
+            key = (channel, record["message_id"])
+            assert key not in self.messages, f"{key} fetched twice"
+            self.messages[key] = record
+
+    def ids(self, channel):
+        return sorted(message_id for key_channel, message_id in self.messages if key_channel == channel)
+
+async def scrape_once(client, store, state_path, limit):
+    state = telegram_scraper.ScrapeState(str(state_path))
+    return await telegram_scraper.scrape_channels(client, ["a"], unlimited(), limit=limit, state=state, on_page=store)
+
+async def test_reruns_fetch_new_messages_first_then_backfill(tmp_path):
+    client = FakeClient()
+    client.post("a", 450)
+    store = Store()
+    state_path = tmp_path / "state.json"
+
+    # Newest page first, then history below it
+    await scrape_once(client, store, state_path, limit=150)
+    assert store.ids("a") == list(range(301, 451))
+    assert telegram_scraper.ScrapeState(str(state_path)).get("a") == {"last_id": 450, "oldest_id": 301, "backfill_done": False}
+
+    # New messages come before the rest of the backfill
+    client.post("a", 20)
+    await scrape_once(client, store, state_path, limit=150)
+    assert store.ids("a") == list(range(171, 471))
+
+    await scrape_once(client, store, state_path, limit=1000)
+    assert store.ids("a") == list(range(1, 471))
+    assert telegram_scraper.ScrapeState(str(state_path)).get("a")["backfill_done"]
+
+    df = await scrape_once(client, store, state_path, limit=1000)
+    assert df.empty
+
+async def test_a_failed_page_is_fetched_again_on_the_next_run(tmp_path):
+    client = FakeClient()
+    client.post("a", 300)
+    state_path = tmp_path / "state.json"
+
+    store = Store(fail_after=1)
+    await scrape_once(client, store, state_path, limit=300)
+    assert store.ids("a") == list(range(201, 301))
+    assert telegram_scraper.ScrapeState(str(state_path)).get("a")["oldest_id"] == 201
+
+    store.fail_after = None
+    await scrape_once(client, store, state_path, limit=300)
+    assert store.ids("a") == list(range(1, 301))